@@ -1,6 +1,8 @@
-import requests
+from . import jsonlib
 from . import settings
+from . import transport
 from .family import Family
+from .utils import async_bounded_map, bounded_map
 
 
 def get_family(guid: str):
@@ -12,9 +14,9 @@ def get_family(guid: str):
     if settings.BIM_KEY:
         url = settings.GET_FULL_FAMILY.format(guid)
         headers = settings.BIM_HEADERS
-        response = requests.get(url, headers=headers)
+        response = transport.cached_get(url, headers=headers)
         if response.ok:
-            response_json = response.json()
+            response_json = jsonlib.loads(response.content)
             if response_json:
                 try:
                     return response_json.get("BusinessFamilies", [])[0]
@@ -38,3 +40,77 @@ async def async_get_family(guid, session):
                     return response_json.get("BusinessFamilies", [])[0]
                 except IndexError as e:
                     print("Family Is Deleted: {}".format(e))
+
+
+def _report_error(guid, error):
+    print("Could not fetch family {}: {}".format(guid, error))
+
+
+def _checked_json(guid, family_json, error, on_error):
+    """Returns the fetched family json, or None once a failed or missing fetch is reported"""
+    if error is None and not family_json:
+        error = LookupError("Family {} was not returned".format(guid))
+    if error is not None:
+        (on_error or _report_error)(guid, error)
+        return None
+    return family_json
+
+
+def _to_family(guid, family_json, error, on_error, lazy=False):
+    family_json = _checked_json(guid, family_json, error, on_error)
+    if family_json is not None:
+        return Family.from_json(family_json, lazy=lazy)
+
+
+def iter_family_json(ids, concurrency=10, on_error=None):
+    """Yields the admin json of each family as soon as its fetch completes, with at most `concurrency` requests in flight.
+
+    Failed or missing ids are passed to on_error and skipped, the rest of the batch continues.
+    Keep concurrency at or below the ssgbim.com pool size in settings.POOL_HOST_LIMITS.
+
+    Args:
+        ids (iterable): Unique Family Ids
+        concurrency (int, optional): Maximum requests in flight. Defaults to 10.
+        on_error (callable, optional): Called with (guid, exception). Defaults to printing the error.
+    """
+    for guid, family_json, error in bounded_map(get_family, ids, concurrency):
+        family_json = _checked_json(guid, family_json, error, on_error)
+        if family_json is not None:
+            yield family_json
+
+
+def iter_families(ids, concurrency=10, on_error=None, lazy=False):
+    """Yields a Family for each id as soon as its fetch completes, see iter_family_json
+
+    Args:
+        ids (iterable): Unique Family Ids
+        concurrency (int, optional): Maximum requests in flight. Defaults to 10.
+        on_error (callable, optional): Called with (guid, exception). Defaults to printing the error.
+        lazy (bool, optional): Build the families with Family.from_json(lazy=True). Defaults to False.
+    """
+    for family_json in iter_family_json(ids, concurrency, on_error):
+        yield Family.from_json(family_json, lazy=lazy)
+
+
+async def async_iter_families(ids, concurrency=10, client=None, on_error=None, lazy=False):
+    """Async version of iter_families
+
+    Args:
+        ids (iterable): Unique Family Ids
+        concurrency (int, optional): Maximum requests in flight. Defaults to 10.
+        client (AsyncFetchClient, optional): Client to fetch with. Defaults to a new client for this batch.
+        on_error (callable, optional): Called with (guid, exception). Defaults to printing the error.
+        lazy (bool, optional): Build the families with Family.from_json(lazy=True). Defaults to False.
+    """
+    if client is None:
+        from .client import AsyncFetchClient
+
+        async with AsyncFetchClient() as client:
+            async for family in async_iter_families(ids, concurrency, client, on_error, lazy):
+                yield family
+        return
+
+    async for guid, family_json, error in async_bounded_map(client.get_family, ids, concurrency):
+        family = _to_family(guid, family_json, error, on_error, lazy)
+        if family is not None:
+            yield family
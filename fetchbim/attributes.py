@@ -1,7 +1,12 @@
 import base64
-import json
+import mmap
+import os
 from enum import Enum
 
+from . import jsonlib
+from . import settings
+from .utils import fields_dict, schema_from_json
+
 
 class AttributeType(Enum):
     PARAMETER = 0
@@ -10,20 +15,29 @@ class AttributeType(Enum):
 
 
 class Attribute(object):
+    __slots__ = ("Name", "Value", "Deleted")
+    _fields = ("Name", "Value", "Deleted")
+
     def __init__(self, Name, Value, Deleted=False):
         self.Name = Name
         self.Value = Value
         self.Deleted = Deleted
         super(Attribute, self).__init__()
 
+    def to_dict(self):
+        return fields_dict(self)
+
     def to_json(self):
-        return json.dumps(self.__dict__)
+        return jsonlib.dumps(self.to_dict())
 
     def __str__(self):
         return "{}: {}".format(self.Name, self.Value)
 
 
 class Property(Attribute):
+    __slots__ = ("Id",)
+    _fields = Attribute._fields + ("Id",)
+    _schema = (("Name", ""), ("Value", ""), ("Deleted", False), ("Id", 0))
     AttributeType = 1
 
     def __init__(self, Name, Value, Deleted=False, Id=0):
@@ -33,18 +47,25 @@ class Property(Attribute):
 
     @classmethod
     def from_json(cls, json_dict):
-        return cls(
-            json_dict.get("Name", ""),
-            json_dict.get("Value", ""),
-            json_dict.get("Deleted", False),
-            json_dict.get("Id", 0),
-        )
+        return schema_from_json(cls, json_dict)
 
     def __repr__(self):
         return "Property(Name={}, Value={}, Deleted={}, Id={})".format(self.Name, self.Value, self.Deleted, self.Id)
 
 
 class Parameter(Attribute):
+    __slots__ = ("DataType", "ParameterType", "Sort", "Hidden", "ParameterId")
+    _fields = Attribute._fields + __slots__
+    _schema = (
+        ("Name", ""),
+        ("Value", ""),
+        ("Deleted", False),
+        ("DataType", None),
+        ("ParameterType", None),
+        ("Sort", None),
+        ("Hidden", False),
+        ("ParameterId", 0),
+    )
     AttributeType = 0
 
     def __init__(
@@ -68,16 +89,7 @@ class Parameter(Attribute):
 
     @classmethod
     def from_json(cls, json_dict):
-        Name = json_dict.get("Name", "")
-        Value = json_dict.get("Value", "")
-        Deleted = json_dict.get("Deleted", False)
-        DataType = json_dict.get("DataType")
-        ParameterType = json_dict.get("ParameterType")
-        Sort = json_dict.get("Sort")
-        Hidden = json_dict.get("Hidden", False)
-        ParameterId = json_dict.get("ParameterId", 0)
-
-        return cls(Name, Value, Deleted, DataType, ParameterType, Sort, Hidden, ParameterId)
+        return schema_from_json(cls, json_dict)
 
     def __repr__(self):
         return "Parameter(Name={}, Value={}, Deleted={}, DataType={}, ParameterType={}, Sort={}, Hidden={}, ParameterId={})".format(
@@ -93,6 +105,27 @@ class Parameter(Attribute):
 
 
 class File(Attribute):
+    __slots__ = (
+        "FilePath",
+        "FileKey",
+        "FileName",
+        "FileExtension",
+        "FileNameWithExtension",
+        "FileLength",
+        "Version",
+        "_FileData",
+        "_on_disk",
+    )
+    _fields = Attribute._fields + __slots__[:-2]
+    _schema = (
+        ("FileNameWithExtension", ""),
+        ("FileKey", ""),
+        ("Deleted", False),
+        ("FileData", ""),
+        ("FileLength", 0),
+        ("Version", ""),
+    )
+
     def __init__(self, FilePath, FileKey="FamilyRevitFile", Deleted=False, FileData="", FileLength=0, Version=""):
         super(File, self).__init__(FileKey, FilePath, Deleted)
         self.FilePath = FilePath
@@ -102,31 +135,69 @@ class File(Attribute):
         self.FileNameWithExtension = self.FileName + self.FileExtension
         self.FileLength = FileLength
         self.Version = Version
-
-        if FileData == "":
-            with open(self.FilePath, "rb") as file:
-                byteform = base64.b64encode(file.read())
-                self.FileData = byteform.decode("utf-8")
-        else:
-            self.FileData = FileData
+        # Without FileData the file is read from FilePath, base64 encoded in chunks only when serialized
+        self._FileData = FileData
+        self._on_disk = FileData == "" and os.path.isfile(FilePath)
+        if self._on_disk:
+            self.FileLength = os.stat(FilePath).st_size
+
+    @property
+    def FileData(self):
+        """Base64 encoded file contents. Files on disk are encoded on every access, use iter_file_data to stream them."""
+        if self._on_disk:
+            return "".join(self.iter_file_data())
+        return self._FileData
+
+    @FileData.setter
+    def FileData(self, value):
+        self._FileData = value
+        self._on_disk = False
+
+    @property
+    def on_disk(self):
+        """True when the file data is read from FilePath instead of held in memory.
+
+        Set when the File is created without FileData and FilePath is an existing file. A File whose
+        path does not exist has no data at all and is not on disk.
+        """
+        return self._on_disk
+
+    def iter_file_data(self, chunk_size=None):
+        """Yields the base64 encoded file contents in chunks, reading the file through a memory map
+
+        Args:
+            chunk_size (int, optional): Bytes encoded per chunk, rounded down to a multiple of 3. Defaults to settings.FILE_CHUNK_SIZE.
+        """
+        if not self.on_disk:
+            yield self._FileData
+            return
+        chunk_size = chunk_size or settings.FILE_CHUNK_SIZE
+        chunk_size = max(3, chunk_size - chunk_size % 3)
+        with open(self.FilePath, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for start in range(0, len(data), chunk_size):
+                    yield base64.b64encode(data[start : start + chunk_size]).decode("ascii")
+
+    def to_dict(self, include_data=True):
+        data = fields_dict(self)
+        if include_data:
+            data["FileData"] = self.FileData
+        return data
 
     def length_to_kb(self):
         return int(self.FileLength / 1024)
 
     @classmethod
     def from_json(cls, json_dict):
-        FilePath = json_dict.get("FileNameWithExtension", "")
-        FileKey = json_dict.get("FileKey", "")
-        Deleted = json_dict.get("Deleted", False)
-        FileData = json_dict.get("FileData", "")
-        FileLength = json_dict.get("FileLength", 0)
-        Version = json_dict.get("Version", "")
-
-        return cls(FilePath, FileKey, Deleted, FileData, FileLength, Version)
+        return schema_from_json(cls, json_dict)
 
     def __repr__(self):
+        # never encode the file just to show it
+        file_data = "<on disk>" if self.on_disk else self._FileData
         return "File(FilePath={}, FileKey={}, Deleted={}, FileData={}, FileLength={}, Version={})".format(
-            self.FilePath, self.FileKey, self.Deleted, self.FileData, self.FileLength, self.Version
+            self.FilePath, self.FileKey, self.Deleted, file_data, self.FileLength, self.Version
         )
 
     def __str__(self):
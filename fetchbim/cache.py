@@ -0,0 +1,133 @@
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from . import settings
+
+
+class ResponseCache:
+    """
+    sqlite-backed cache of GET response bodies keyed by url.
+
+    Entries older than `ttl` seconds are stale: they are revalidated with If-None-Match /
+    If-Modified-Since when the server sent an ETag or Last-Modified, otherwise fetched again.
+    The least recently used entries are evicted once the bodies exceed `max_bytes`.
+    """
+
+    def __init__(self, path=None, ttl=None, max_bytes=None):
+        self.path = path or settings.CACHE_PATH
+        self.ttl = settings.CACHE_TTL if ttl is None else ttl
+        self.max_bytes = settings.CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT PRIMARY KEY, body BLOB, content_type TEXT, etag TEXT, last_modified TEXT, "
+                "stored_at REAL, accessed_at REAL, size INTEGER)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def get(self, url):
+        """Returns the cached entry for url as a dictionary, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, content_type, etag, last_modified, stored_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        body, content_type, etag, last_modified, stored_at = row
+        return {
+            "url": url,
+            "body": body,
+            "content_type": content_type,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": stored_at,
+        }
+
+    def is_fresh(self, entry):
+        return self.ttl is None or time.time() - entry["stored_at"] < self.ttl
+
+    def put(self, url, response):
+        """Stores the body and validators of a successful response"""
+        body = response.content
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    sqlite3.Binary(body),
+                    response.headers.get("Content-Type"),
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    now,
+                    now,
+                    len(body),
+                ),
+            )
+            self._evict()
+
+    def touch(self, url):
+        """Marks an entry fresh again after the server confirmed it is unchanged (304)"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        stale = []
+        for url, size in self._conn.execute("SELECT url, size FROM responses ORDER BY accessed_at"):
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((url,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE url = ?", stale)
+
+    def invalidate(self, url):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self):
+        self._conn.close()
+
+    @property
+    def size(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __repr__(self):
+        return "ResponseCache(path={}, ttl={}, max_bytes={})".format(self.path, self.ttl, self.max_bytes)
+
+    @staticmethod
+    def to_response(entry):
+        """Builds a requests.Response from a cached entry"""
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = entry["url"]
+        response._content = bytes(entry["body"])
+        response.headers = CaseInsensitiveDict()
+        for header, key in (("Content-Type", "content_type"), ("ETag", "etag"), ("Last-Modified", "last_modified")):
+            if entry[key]:
+                response.headers[header] = entry[key]
+        return response
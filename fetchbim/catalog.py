@@ -0,0 +1,242 @@
+import sqlite3
+import threading
+import time
+
+from . import jsonlib
+from . import settings
+from .admin import iter_family_json
+from .bimservice import get_ids
+from .family import Family
+from .query import CompoundFilter, MatchType
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS families ("
+    "id TEXT PRIMARY KEY, name TEXT COLLATE NOCASE, category TEXT COLLATE NOCASE, "
+    "object_type TEXT COLLATE NOCASE, deleted INTEGER, body BLOB, updated_at REAL)",
+    "CREATE TABLE IF NOT EXISTS parameters (family_id TEXT, name TEXT COLLATE NOCASE, value TEXT COLLATE NOCASE)",
+    "CREATE TABLE IF NOT EXISTS properties (family_id TEXT, name TEXT COLLATE NOCASE, value TEXT COLLATE NOCASE)",
+    "CREATE TABLE IF NOT EXISTS files (family_id TEXT, file_key TEXT COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS families_category ON families (category)",
+    "CREATE INDEX IF NOT EXISTS families_object_type ON families (object_type)",
+    "CREATE INDEX IF NOT EXISTS parameters_name_value ON parameters (name, value)",
+    "CREATE INDEX IF NOT EXISTS parameters_family ON parameters (family_id)",
+    "CREATE INDEX IF NOT EXISTS properties_name_value ON properties (name, value)",
+    "CREATE INDEX IF NOT EXISTS properties_family ON properties (family_id)",
+    "CREATE INDEX IF NOT EXISTS files_file_key ON files (file_key)",
+    "CREATE INDEX IF NOT EXISTS files_family ON files (family_id)",
+)
+
+# Columns a family summary is made of, the same keys Filter.query returns
+_SUMMARY = ("Id", "Name", "CategoryName", "FamilyObjectType", "Deleted")
+
+
+def _text(value):
+    if value is None:
+        return None
+    return str(value)
+
+
+def _like_escape(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _match(column, value, match_type):
+    """Returns an sql condition and its arguments matching column against value with MatchType semantics"""
+    match_type = MatchType(match_type) if match_type is not None else MatchType.EQUALS
+    if match_type == MatchType.EQUALS:
+        return "{} = ?".format(column), [value]
+    pattern = _like_escape(value)
+    if match_type == MatchType.STARTS:
+        pattern = pattern + "%"
+    elif match_type == MatchType.ENDS:
+        pattern = "%" + pattern
+    else:
+        pattern = "%" + pattern + "%"
+    return "{} LIKE ? ESCAPE '\\'".format(column), [pattern]
+
+
+class Catalog:
+    """
+    Local sqlite snapshot of the admin catalog for answering Filter queries offline.
+
+    Every family record is stored whole, along with indexed tables of its parameters,
+    properties and file keys. Filters are evaluated with the api's rules: every field that is
+    set must match, names compare case-insensitively and values use the Filter's MatchType.
+    CategoryName matches the category and everything below it.
+
+    Example:
+        catalog = Catalog()
+        catalog.build()
+        ids = catalog.get_ids(Filter(FamilyObjectType="ModelGroup"))
+    """
+
+    def __init__(self, path=None):
+        self.path = path or settings.CATALOG_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    # Loading
+    def build(self, ids=None, all_families=False, concurrency=10, on_error=None):
+        """Fetches every family and stores it
+
+        Args:
+            ids (list, optional): Family ids to load. Defaults to bimservice.get_ids(all_families).
+            all_families (bool, optional): Include private families when ids is not given. Defaults to False.
+            concurrency (int, optional): Maximum requests in flight. Defaults to 10.
+            on_error (callable, optional): Called with (guid, error) for each failed fetch, see admin.iter_family_json.
+                Defaults to printing.
+
+        Returns:
+            int: Number of families stored
+        """
+        if ids is None:
+            ids = get_ids(all_families)
+        stored = 0
+        for family_json in iter_family_json(ids, concurrency, on_error):
+            self.add(family_json)
+            stored += 1
+        return stored
+
+    def add(self, family_json):
+        """Stores or replaces one family record as returned by admin.get_family"""
+        guid = family_json["Id"]
+        parameters = list(family_json.get("Parameters") or [])
+        files = list(family_json.get("Files") or [])
+        for family_type in family_json.get("FamilyTypes") or []:
+            parameters.extend(family_type.get("Parameters") or [])
+            files.extend(family_type.get("Files") or [])
+        with self._lock, self._conn:
+            self._delete(guid)
+            self._conn.execute(
+                "INSERT INTO families VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    guid,
+                    family_json.get("Name"),
+                    family_json.get("CategoryName"),
+                    family_json.get("FamilyObjectType"),
+                    int(bool(family_json.get("Deleted"))),
+                    sqlite3.Binary(jsonlib.dumps_bytes(family_json)),
+                    time.time(),
+                ),
+            )
+            self._conn.executemany(
+                "INSERT INTO parameters VALUES (?, ?, ?)",
+                [(guid, p.get("Name"), _text(p.get("Value"))) for p in parameters if not p.get("Deleted")],
+            )
+            self._conn.executemany(
+                "INSERT INTO properties VALUES (?, ?, ?)",
+                [
+                    (guid, p.get("Name"), _text(p.get("Value")))
+                    for p in family_json.get("Properties") or []
+                    if not p.get("Deleted")
+                ],
+            )
+            self._conn.executemany(
+                "INSERT INTO files VALUES (?, ?)",
+                [(guid, f.get("FileKey")) for f in files if not f.get("Deleted")],
+            )
+
+    def remove(self, guid):
+        with self._lock, self._conn:
+            self._delete(guid)
+
+    def _delete(self, guid):
+        for table, column in (("families", "id"), ("parameters", "family_id"), ("properties", "family_id"), ("files", "family_id")):
+            self._conn.execute("DELETE FROM {} WHERE {} = ?".format(table, column), (guid,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            for table in ("families", "parameters", "properties", "files"):
+                self._conn.execute("DELETE FROM {}".format(table))
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM families").fetchone()[0]
+
+    # Queries
+    def _where(self, family_filter, include_deleted=False):
+        conditions = []
+        args = []
+        if not include_deleted:
+            conditions.append("deleted = 0")
+        if family_filter.FamilyObjectType:
+            conditions.append("object_type = ?")
+            args.append(family_filter.FamilyObjectType)
+        if family_filter.CategoryName:
+            conditions.append("(category = ? OR category LIKE ? ESCAPE '\\')")
+            args.extend([family_filter.CategoryName, _like_escape(family_filter.CategoryName) + "/%"])
+        for table, name, value, match_type in (
+            ("parameters", family_filter.ParameterName, family_filter.ParameterValue, family_filter.ParameterValueMatchType),
+            ("properties", family_filter.PropertyName, family_filter.PropertyValue, family_filter.PropertyValueMatchType),
+        ):
+            if not name:
+                continue
+            sub = "SELECT family_id FROM {} WHERE name = ?".format(table)
+            sub_args = [name]
+            if value is not None:
+                condition, match_args = _match("value", str(value), match_type)
+                sub = "{} AND {}".format(sub, condition)
+                sub_args.extend(match_args)
+            conditions.append("id IN ({})".format(sub))
+            args.extend(sub_args)
+        if family_filter.FileKey:
+            conditions.append("id IN (SELECT family_id FROM files WHERE file_key = ?)")
+            args.append(family_filter.FileKey)
+        return " AND ".join(conditions) or "1", args
+
+    def _select(self, columns, family_filter, include_deleted=False):
+        where, args = self._where(family_filter, include_deleted)
+        with self._lock:
+            return self._conn.execute("SELECT {} FROM families WHERE {}".format(columns, where), args).fetchall()
+
+    def get_ids(self, family_filter, include_deleted=False):
+        """Returns the ids of the stored families matching a Filter or CompoundFilter"""
+        if isinstance(family_filter, CompoundFilter):
+            leaves = family_filter.leaves()
+            results = {}
+            for key, leaf in leaves.items():
+                results[key] = [{"Id": guid} for guid in self.get_ids(leaf, include_deleted)]
+            return list(family_filter.evaluate(results))
+        return [row[0] for row in self._select("id", family_filter, include_deleted)]
+
+    def query(self, family_filter, include_deleted=False):
+        """Returns summaries (Id, Name, CategoryName, FamilyObjectType, Deleted) of the matching families"""
+        if isinstance(family_filter, CompoundFilter):
+            ids = self.get_ids(family_filter, include_deleted)
+            rows = self._rows("id, name, category, object_type, deleted", ids)
+        else:
+            rows = self._select("id, name, category, object_type, deleted", family_filter, include_deleted)
+        return [dict(zip(_SUMMARY, row[:4] + (bool(row[4]),))) for row in rows]
+
+    def _rows(self, columns, ids):
+        rows = []
+        ids = list(ids)
+        with self._lock:
+            # stay under sqlite's bound parameter limit
+            for start in range(0, len(ids), 500):
+                chunk = ids[start : start + 500]
+                rows.extend(
+                    self._conn.execute(
+                        "SELECT {} FROM families WHERE id IN ({})".format(columns, ", ".join("?" * len(chunk))), chunk
+                    ).fetchall()
+                )
+        return rows
+
+    def get_json(self, guid):
+        """Returns the stored family record, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM families WHERE id = ?", (guid,)).fetchone()
+        if row is not None:
+            return jsonlib.loads(bytes(row[0]))
+
+    def families(self, family_filter, include_deleted=False, lazy=False):
+        """Yields Family objects built from the stored records matching a Filter or CompoundFilter"""
+        ids = self.get_ids(family_filter, include_deleted)
+        for _, body in self._rows("id, body", ids):
+            yield Family.from_bytes(bytes(body), lazy=lazy)
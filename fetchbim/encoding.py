@@ -0,0 +1,68 @@
+import json
+
+from . import settings
+from .utils import json_default
+
+
+def _iter_json(o):
+    """Yields the json encoding of o as strings, streaming the data of files on disk"""
+    if isinstance(o, str) or o is None or isinstance(o, (bool, int, float)):
+        yield json.dumps(o)
+    elif isinstance(o, dict):
+        yield "{"
+        first = True
+        for key, value in o.items():
+            if not first:
+                yield ","
+            first = False
+            yield json.dumps(str(key))
+            yield ":"
+            yield from _iter_json(value)
+        yield "}"
+    elif isinstance(o, (list, tuple)):
+        yield "["
+        for i, value in enumerate(o):
+            if i:
+                yield ","
+            yield from _iter_json(value)
+        yield "]"
+    elif getattr(o, "on_disk", False):
+        yield from _iter_file(o, o.to_dict(include_data=False))
+    else:
+        yield from _iter_json(json_default(o))
+
+
+def _iter_file(file, data):
+    yield "{"
+    for key, value in data.items():
+        yield json.dumps(key)
+        yield ":"
+        yield from _iter_json(value)
+        yield ","
+    yield '"FileData":"'
+    yield from file.iter_file_data()
+    yield '"}'
+
+
+def iter_json(obj, chunk_size=None):
+    """Yields the json encoding of obj as utf-8 bytes chunks of about chunk_size.
+
+    Files whose data is on disk are base64 encoded straight from the file as the body is
+    consumed, so a family of any size is encoded in constant memory.
+
+    Args:
+        obj: Model object, dict, list or json scalar
+        chunk_size (int, optional): Bytes to buffer before yielding. Defaults to settings.FILE_CHUNK_SIZE.
+    """
+    chunk_size = chunk_size or settings.FILE_CHUNK_SIZE
+    buffer = []
+    size = 0
+    for piece in _iter_json(obj):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
@@ -1,11 +1,13 @@
-import requests
-import json
-
+from . import jsonlib
 from . import settings
+from . import transport
 from .attributes import Property, Parameter, File
 from .notion import NotionProperty as np
 from .notion import NotionFilter, PropertyType, NotionPage
-from .utils import retry
+from .sync import payload_hash
+from .utils import fields_dict, json_default, schema_from_json
+from .encoding import iter_json
+from .containers import IndexedField
 from enum import Enum
 
 
@@ -16,6 +18,10 @@ class Status(Enum):
 
 
 class Object(object):
+    __slots__ = ("Name", "_Parameters")
+    _fields = ("Name", "Parameters")
+    Parameters = IndexedField("Name", "ParameterId")
+
     def __init__(self, Name, Parameters=None):
         self.Name = Name
         if Parameters == None:
@@ -24,40 +30,53 @@ class Object(object):
             self.Parameters = Parameters
         super(Object, self).__init__()
 
+    def to_dict(self):
+        return fields_dict(self)
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return jsonlib.dumps(self, default=json_default)
 
     def add_parameters(self, parameters):
         if not isinstance(parameters, list):
-            params = [parameters]
-        for param in params:
-            if param.Name not in [x.Name for x in self.Parameters]:
+            parameters = [parameters]
+        for param in parameters:
+            if not self.Parameters.has(param.Name):
                 self.Parameters.append(param)
             else:
-                print("Parameter {} is already in the family").format(param.Name)
+                print("Parameter {} is already in the family".format(param.Name))
 
     def remove_parameters(self, parameters):
         if not isinstance(parameters, list):
-            params = [parameters]
-        for param in params:
-            for p in self.Parameters:
-                if param.Name == p.Name:
-                    if p.ParameterId > 0:
-                        p.Deleted = True
-                    else:
-                        self.Parameters.remove(p)
+            parameters = [parameters]
+        for param in parameters:
+            for p in self.Parameters.lookup(param.Name):
+                if p.ParameterId > 0:
+                    p.Deleted = True
+                else:
+                    self.Parameters.remove(p)
 
     def add_files(self, files):
         if not isinstance(files, list):
-            fls = [files]
-        for f in fls:
-            for existing_file in self.Files:
-                if f.FileKey == existing_file.FileKey:
-                    existing_file.Deleted = True
+            files = [files]
+        for f in files:
+            for existing_file in self.Files.lookup(f.FileKey, "FileKey"):
+                existing_file.Deleted = True
             self.Files.append(f)
 
 
 class FamilyType(Object):
+    __slots__ = ("_Files", "IsDefault", "Deleted", "Id", "FamilyId")
+    _fields = Object._fields + ("Files", "IsDefault", "Deleted", "Id", "FamilyId")
+    _schema = (
+        ("Name", ""),
+        ("Parameters", None, Parameter),
+        ("Files", None, File),
+        ("IsDefault", False),
+        ("Deleted", False),
+        ("Id", ""),
+    )
+    Files = IndexedField("FileKey", "FileName")
+
     def __init__(
         self,
         Name,
@@ -80,20 +99,7 @@ class FamilyType(Object):
 
     @classmethod
     def from_json(cls, json_dict):
-        Id = json_dict.get("Id", "")
-        Name = json_dict.get("Name", "")
-        Parameters = []
-        if json_dict.get("Parameters", []):
-            for param in json_dict.get("Parameters", []):
-                Parameters.append(Parameter.from_json(param))
-        Files = []
-        if json_dict.get("Files", []):
-            for file in json_dict.get("Files", []):
-                Files.append(File.from_json(file))
-        IsDefault = json_dict.get("IsDefault", False)
-        Deleted = json_dict.get("Deleted", False)
-
-        return cls(Name, Parameters, Files, IsDefault, Deleted, Id)
+        return schema_from_json(cls, json_dict)
 
     @classmethod
     def from_service(cls, json_dict):
@@ -111,11 +117,9 @@ class FamilyType(Object):
         if not isinstance(attributes, list):
             attributes = [attributes]
         for attribute in attributes:
-            if attribute.__class__.__name__ == "Parameter" and attribute.ParameterId not in [
-                x.ParameterId for x in self.Parameters
-            ]:
+            if isinstance(attribute, Parameter) and not self.Parameters.has(attribute.ParameterId, "ParameterId"):
                 self.Parameters.append(attribute)
-            elif attribute.__class__.__name__ == "File" and attribute.FileId not in [x.FileId for x in self.Files]:
+            elif isinstance(attribute, File) and not self.Files.has(attribute.FileKey, "FileKey"):
                 self.Files.append(attribute)
 
     def __repr__(self):
@@ -133,7 +137,160 @@ class FamilyType(Object):
         return "[{}: {}]".format(self.Id, self.Name)
 
 
+class GroupedFamily:
+    __slots__ = (
+        "ChildFamilyName",
+        "ChildFamilyId",
+        "FamilyTypeId",
+        "InstanceCount",
+        "Deleted",
+        "Sort",
+        "Width",
+        "Depth",
+        "Rotation",
+        "Parameters",
+        "ChildModelGroups",
+    )
+    _fields = __slots__
+    _schema = (
+        ("ChildFamilyId", None),
+        ("FamilyTypeId", None),
+        ("ChildFamilyId", None),
+        ("InstanceCount", 1),
+        ("Deleted", False),
+        ("Sort", 0),
+        ("Width", 0),
+        ("Depth", 0),
+        ("Rotation", 0),
+        ("Parameters", None),
+        ("ChildModelGroups", None),
+    )
+
+    def __init__(
+        self,
+        ChildFamilyId,
+        FamilyTypeId,
+        ChildFamilyName=None,
+        InstanceCount=1,
+        Deleted=False,
+        Sort=0,
+        Width=0,
+        Depth=0,
+        Rotation=0,
+        Parameters=None,
+        ChildModelGroups=None,
+    ):
+        self.ChildFamilyName = ChildFamilyName
+        self.ChildFamilyId = ChildFamilyId
+        self.FamilyTypeId = FamilyTypeId
+        self.InstanceCount = InstanceCount
+        self.Deleted = Deleted
+        self.Sort = Sort
+        self.Width = Width
+        self.Depth = Depth
+        self.Rotation = Rotation
+        if Parameters == None:
+            self.Parameters = []
+        else:
+            self.Parameters = Parameters
+        if ChildModelGroups == None:
+            self.ChildModelGroups = []
+        else:
+            self.ChildModelGroups = ChildModelGroups
+
+    def to_dict(self):
+        return fields_dict(self)
+
+    def to_json(self):
+        return jsonlib.dumps(self, default=json_default)
+
+    @classmethod
+    def from_json(cls, json_dict):
+        return schema_from_json(cls, json_dict)
+
+    @classmethod
+    def from_service(cls, json_dict):
+        ChildFamilyId = json_dict.get("childFamilyId")
+        ChildFamily = json_dict.get("childFamily")
+        if ChildFamily:
+            ChildFamilyName = ChildFamily.get("familyName")
+            ChildFamilyTypes = ChildFamily.get("FamilyType")
+            if ChildFamilyTypes:
+                FamilyTypeId = ChildFamilyTypes[0].get("familyTypeId")
+
+        InstanceCount = json_dict.get("instanceCount", 1)
+        Sort = json_dict.get("sort", 0)
+        Width = json_dict.get("width", 0)
+        Depth = json_dict.get("depth", 0)
+        Rotation = json_dict.get("rotation", 0)
+        Parameters = json_dict.get("parameters", [])
+
+        return cls(
+            ChildFamilyId,
+            FamilyTypeId,
+            ChildFamilyName,
+            InstanceCount,
+            False,
+            Sort,
+            Width,
+            Depth,
+            Rotation,
+            Parameters,
+        )
+
+    def __repr__(self):
+        return "GroupedFamily(ChildFamilyId={}, FamilyTypeId={}, ChildFamilyName={}, InstanceCount={}, Deleted={}, Sort={}, Width={}, Depth={}, Rotation={}, Parameters={}, ChildModelGroups={})".format(
+            self.ChildFamilyId,
+            self.FamilyTypeId,
+            self.ChildFamilyName,
+            self.InstanceCount,
+            self.Deleted,
+            self.Sort,
+            self.Width,
+            self.Depth,
+            self.Rotation,
+            self.Parameters,
+            self.ChildModelGroups,
+        )
+
+
 class Family(Object):
+    __slots__ = (
+        "Status",
+        "FamilyObjectType",
+        "CategoryName",
+        "LoadMethod",
+        "Deleted",
+        "Id",
+        "IsNew",
+        "_Properties",
+        "_Files",
+        "_GroupedFamilies",
+        "_FamilyTypes",
+        "_raw",
+    )
+    _fields = Object._fields + tuple(name.lstrip("_") for name in __slots__[:-1])
+    _schema = (
+        ("Name", ""),
+        ("Status", None),
+        ("LoadMethod", None),
+        ("CategoryName", ""),
+        ("FamilyObjectType", None),
+        ("Properties", None, Property),
+        ("Parameters", None, Parameter),
+        ("Files", None, File),
+        ("Deleted", None),
+        ("Id", ""),
+        ("GroupedFamilies", None, GroupedFamily),
+        ("FamilyTypes", None, FamilyType),
+    )
+    Properties = IndexedField("Name")
+    Files = IndexedField("FileKey", "FileName")
+    GroupedFamilies = IndexedField("ChildFamilyId")
+    FamilyTypes = IndexedField("Name")
+    # Sub-collections a lazy family keeps as raw json until first accessed
+    _sections = ("Properties", "Parameters", "Files", "GroupedFamilies", "FamilyTypes")
+
     def __init__(
         self,
         Name,
@@ -176,45 +333,119 @@ class Family(Object):
             self.FamilyTypes = []
         else:
             self.FamilyTypes = FamilyTypes
+        self._raw = None
+
+    def _load_section(self, name):
+        """Builds a sub-collection of a lazy family from its raw json on first access"""
+        if name not in self._sections:
+            raise AttributeError(name)
+        item_class = next(entry[2] for entry in self._schema if entry[0] == name)
+        items = [item_class.from_json(x) for x in (self._raw or {}).get(name) or []]
+        if name == "FamilyTypes":
+            for f_type in items:
+                f_type.FamilyId = self.Id
+        setattr(self, name, items)
+        return getattr(self, "_" + name)
+
+    def is_loaded(self, name):
+        """False while the sub-collection `name` of a lazy family is still raw json"""
+        return getattr(type(self), name).is_loaded(self)
+
+    def to_dict(self):
+        data = {}
+        for field in self._fields:
+            if field in self._sections and not self.is_loaded(field):
+                # Untouched sections pass straight through
+                data[field] = self._raw.get(field) or []
+            else:
+                data[field] = getattr(self, field)
+        return data
 
-    @retry
-    def post(self):
-        data = self.to_json()
+    def post(self, stream=None):
+        """Creates or updates the family in the admin database and updates it from the response
+
+        Args:
+            stream (bool, optional): Send the body with chunked transfer encoding, reading file data from disk as it is sent.
+                Defaults to streaming whenever a file's data is on disk.
+        """
+        self.check_files()
+        if stream is None:
+            stream = self.has_files_on_disk()
+        if stream:
+            data = lambda: iter_json(self)
+        else:
+            data = self.to_json()
         url = settings.POST_FAMILY
         headers = settings.BIM_HEADERS
-        response = requests.post(url, data=data, headers=headers)
+        response = transport.post(url, data=data, headers=headers)
+        self.invalidate_cache()
         if response.status_code in range(200, 299):
-            result = response.json()
-            self.Id = result.get("Id", "")
-            self.Name = result.get("Name", "")
-            self.Status = result.get("Status")
-            self.LoadMethod = result.get("LoadMethod")
-            self.CategoryName = result.get("CategoryName", "")
-            self.FamilyObjectType = result.get("FamilyObjectType")
-            self.Properties = []
-            for prop in result.get("Properties", []):
-                self.add_properties(Property.from_json(prop))
-            self.Parameters = []
-            for param in result.get("Parameters", []):
-                self.add_parameters(Parameter.from_json(param))
-            self.Files = []
-            for file in result.get("Files", []):
-                self.add_files(File.from_json(file))
-            self.GroupedFamilies = []
-            for fam in result.get("GroupedFamilies", []):
-                self.GroupedFamilies.append(Family.from_json(fam))
-            self.FamilyTypes, Type_Params = [], []
-            for ft in result.get("FamilyTypes", []):
-                for type_param in ft.get("Parameters"):
-                    Type_Params.append(Parameter.from_json(type_param))
-                ft["Parameters"] = Type_Params
-                self.add_type(FamilyType.from_json(ft))
-            self.Deleted = result.get("Deleted")
+            self.update_from_json(jsonlib.loads(response.content))
+            self.invalidate_cache()
         else:
             print(response.text)
 
+    def files_on_disk(self):
+        """Returns the Files of the family and its types whose data is read from disk"""
+        files = list(self.Files) if self.is_loaded("Files") else []
+        if self.is_loaded("FamilyTypes"):
+            for family_type in self.FamilyTypes:
+                files.extend(family_type.Files)
+        return [f for f in files if getattr(f, "on_disk", False)]
+
+    def has_files_on_disk(self):
+        """True if the family or one of its types has a File whose data is read from disk"""
+        return bool(self.files_on_disk())
+
+    def check_files(self):
+        """Opens every File read from disk, so one moved or deleted since it was added raises
+        FileNotFoundError (or another OSError) before a request is sent, not in the middle of the body"""
+        for file in self.files_on_disk():
+            open(file.FilePath, "rb").close()
+
+    def invalidate_cache(self):
+        """Drops the family's cached GET_FULL_FAMILY response"""
+        if self.Id:
+            transport.invalidate(settings.GET_FULL_FAMILY.format(self.Id))
+
+    def update_from_json(self, result):
+        """Updates the family in place from the admin api response to a post
+
+        Args:
+            result (dict): Family json returned by the api
+        """
+        self.Id = result.get("Id", "")
+        self.Name = result.get("Name", "")
+        self.Status = result.get("Status")
+        self.LoadMethod = result.get("LoadMethod")
+        self.CategoryName = result.get("CategoryName", "")
+        self.FamilyObjectType = result.get("FamilyObjectType")
+        self.Properties = []
+        for prop in result.get("Properties", []):
+            self.add_properties(Property.from_json(prop))
+        self.Parameters = []
+        for param in result.get("Parameters", []):
+            self.add_parameters(Parameter.from_json(param))
+        self.Files = []
+        for file in result.get("Files", []):
+            self.add_files(File.from_json(file))
+        self.GroupedFamilies = []
+        for fam in result.get("GroupedFamilies", []):
+            self.GroupedFamilies.append(GroupedFamily.from_json(fam))
+        self.FamilyTypes = []
+        for ft in result.get("FamilyTypes", []):
+            self.add_type(FamilyType.from_json(ft))
+        self.Deleted = result.get("Deleted")
+        self._raw = None
+
     # TODO: add other file data
-    def to_notion(self):
+    def to_notion(self, relations=True, resolver=None):
+        """Returns the Content Calendar page payload of the family
+
+        Args:
+            relations (bool, optional): Include the relation properties. Defaults to True.
+            resolver (RelationResolver, optional): Resolve relations from preloaded indexes instead of querying Notion
+        """
         data = {"properties": {}}
         data["archived"] = False
         if any(x for x in self.Files if x.FileKey == "FamilyImageLarge"):
@@ -271,6 +502,26 @@ class Family(Object):
             product_page = "https://fetchbim.com/catalog/product/view/id/"
             np.set_property(data, product_page + product_id.Value, "_Product Page", "url")
 
+        if relations:
+            for relation in self.relation_properties():
+                value = relation.get("value")
+                if value:
+                    if resolver is not None:
+                        filter_results = resolver.resolve(relation["db_name"], relation["prop_name"], value)
+                    else:
+                        notion_filter = NotionFilter(value, property_name=relation["prop_name"])
+                        filter_results = notion_filter.query(relation["db_name"])
+                    np.set_property(
+                        data,
+                        filter_results,
+                        relation["field_name"],
+                        property_type=PropertyType.RELATION,
+                    )
+
+        return data
+
+    def relation_properties(self):
+        """Returns the Notion relations of the family as dictionaries of value, db_name, prop_name and field_name"""
         relation_properties = [
             {
                 "value": self.CategoryName.split("/")[0],
@@ -315,102 +566,95 @@ class Family(Object):
                 "field_name": "_Families in Model Group",
             },
         ]
-
         for relation in relation_properties:
-            value = relation.get("value")
-            if value:
-                if isinstance(value, Property):
-                    value = value.Value
-                notion_filter = NotionFilter(value, property_name=relation["prop_name"])
-                filter_results = notion_filter.query(relation["db_name"])
-                np.set_property(
-                    data,
-                    filter_results,
-                    relation["field_name"],
-                    property_type=PropertyType.RELATION,
-                )
-
-        return data
-
-    def post_notion(self):
-        data = self.to_notion()
-        exists_filter = NotionFilter(self.Id, property_name="SSGFID")
-        exists = exists_filter.query("Content Calendar")
+            if isinstance(relation["value"], Property):
+                relation["value"] = relation["value"].Value
+
+        return relation_properties
+
+    def post_notion(self, resolver=None, state=None, index=None):
+        """Creates or updates the family's Content Calendar page
+
+        Args:
+            resolver (RelationResolver, optional): Resolve relations without querying Notion
+            state (SyncState, optional): Skip the write, returning None, when the payload is unchanged since the last sync
+            index (NotionIndex, optional): Content Calendar pages by SSGFID, used instead of querying for the page
+        """
+        data = self.to_notion(resolver=resolver)
+        digest = None
+        if state is not None:
+            digest = payload_hash(data)
+            if state.get(self.Id) == digest:
+                return None
+        if index is not None:
+            exists = [{"id": page_id} for page_id in index.get(self.Id, [])]
+        else:
+            exists_filter = NotionFilter(self.Id, property_name="SSGFID")
+            exists = exists_filter.query("Content Calendar")
         if exists:
-            return NotionPage.update(exists[0].get("id"), data)
+            response = NotionPage.update(exists[0].get("id"), data)
         else:
-            return NotionPage.create("Content Calendar", data)
+            response = NotionPage.create("Content Calendar", data)
+            if index is not None and response.ok:
+                index.add(self.Id, jsonlib.loads(response.content)["id"])
+        if digest is not None and response.ok:
+            state.set(self.Id, digest)
+        return response
 
-    @retry
     def delete(self):
         self.Deleted = True
         url = settings.DELETE_FAMILY.format(self.Id)
         headers = settings.BIM_HEADERS
-        return requests.delete(url, headers=headers)
+        self.invalidate_cache()
+        return transport.delete(url, headers=headers)
 
-    @retry
     def restore(self):
         self.Deleted = False
         url = settings.RESTORE_FAMILY.format(self.Id)
         headers = settings.BIM_HEADERS
-        return requests.post(url, headers=headers)
+        self.invalidate_cache()
+        return transport.post(url, headers=headers)
 
     @staticmethod
-    @retry
     def get_json(guid):
-        response = requests.get(settings.GET_FULL_FAMILY.format(guid), headers=settings.BIM_HEADERS)
+        response = transport.cached_get(settings.GET_FULL_FAMILY.format(guid), headers=settings.BIM_HEADERS)
         if response.status_code in range(200, 299):
             try:
-                return response.json()["BusinessFamilies"][0]
+                return jsonlib.loads(response.content)["BusinessFamilies"][0]
             except IndexError as e:
                 print(e)
 
     @classmethod
-    def from_json(cls, json_dict):
-        Id = json_dict.get("Id", "")
-        Name = json_dict.get("Name", "")
-        Status = json_dict.get("Status")
-        LoadMethod = json_dict.get("LoadMethod")
-        CategoryName = json_dict.get("CategoryName", "")
-        FamilyObjectType = json_dict.get("FamilyObjectType")
-        Properties = []
-        if json_dict.get("Properties", []):
-            for prop in json_dict.get("Properties", []):
-                Properties.append(Property.from_json(prop))
-        Parameters = []
-        if json_dict.get("Parameters", []):
-            for param in json_dict.get("Parameters", []):
-                Parameters.append(Parameter.from_json(param))
-        Files = []
-        if json_dict.get("Files", []):
-            for file in json_dict.get("Files", []):
-                Files.append(File.from_json(file))
-        Deleted = json_dict.get("Deleted")
-        GroupedFamilies = []
-        if json_dict.get("GroupedFamilies", []):
-            for fam in json_dict.get("GroupedFamilies", []):
-                GroupedFamilies.append(GroupedFamily.from_json(fam))
-        FamilyTypes = []
-        if json_dict.get("FamilyTypes", []):
-            for fam_type in json_dict.get("FamilyTypes", []):
-                f_type = FamilyType.from_json(fam_type)
-                f_type.FamilyId = Id
-                FamilyTypes.append(f_type)
+    def from_bytes(cls, data, lazy=False):
+        """Builds a Family from raw admin api json bytes, parsed with the selected json backend and built from _schema
 
-        return cls(
-            Name,
-            Status,
-            LoadMethod,
-            CategoryName,
-            FamilyObjectType,
-            Properties,
-            Parameters,
-            Files,
-            Deleted,
-            Id,
-            GroupedFamilies,
-            FamilyTypes,
-        )
+        Args:
+            data (bytes): Family json
+            lazy (bool, optional): See from_json. Defaults to False.
+        """
+        return cls.from_json(jsonlib.loads(data), lazy=lazy)
+
+    @classmethod
+    def from_json(cls, json_dict, lazy=False):
+        """Builds a Family from admin api json
+
+        Args:
+            json_dict (dict): Family json
+            lazy (bool, optional): Keep Properties, Parameters, Files, GroupedFamilies and FamilyTypes as raw json,
+                building each only when first accessed. Defaults to False.
+        """
+        if lazy:
+            family = cls.__new__(cls)
+            for key, default, *item_class in cls._schema:
+                if not item_class:
+                    setattr(family, key, json_dict.get(key, default))
+            family.IsNew = not family.Id
+            family._raw = json_dict
+            return family
+        family = schema_from_json(cls, json_dict)
+        for f_type in family.FamilyTypes:
+            f_type.FamilyId = family.Id
+        return family
 
     @classmethod
     def from_service(cls, json_dict):
@@ -463,38 +707,36 @@ class Family(Object):
         )
 
     def add_type(self, fam_type):
-        names = [ftype.Name for ftype in self.FamilyTypes]
-        if fam_type.Name not in names:
+        if not self.FamilyTypes.has(fam_type.Name):
             fam_type.FamilyId = self.Id
             self.FamilyTypes.append(fam_type)
         else:
-            print("Family Type {} already exists in family").format(fam_type.Name)
+            print("Family Type {} already exists in family".format(fam_type.Name))
 
     def get_property(self, name, default=None):
-        prop = [x for x in self.Properties if x.Name == name and x.Value]
-        if prop:
-            return prop[0]
-        else:
-            return default
+        for prop in self.Properties.lookup(name):
+            if prop.Value:
+                return prop
+        return default
 
     def get_parameter(self, name):
-        param = [x for x in self.Parameters if x.Name == name]
+        param = self.Parameters.lookup(name)
         if len(param) == 1:
             return param[0]
         else:
             return param
 
     def get_file(self, name):
-        return [x for x in self.Files if x.FileName == name]
+        return self.Files.lookup(name, "FileName")
 
     def add_properties(self, properties):
         if not isinstance(properties, list):
-            props = [properties]
-        for prop in props:
-            if prop.Name not in [x.Name for x in self.Properties]:
+            properties = [properties]
+        for prop in properties:
+            if not self.Properties.has(prop.Name):
                 self.Properties.append(prop)
             else:
-                print("Property {} is already in the family").format(prop.Name)
+                print("Property {} is already in the family".format(prop.Name))
 
     def __repr__(self):
         return "Family(Name={}, Status={}, LoadMethod={}, CategoryName={}, FamilyObjectType={}, Properties={}, Parameters={}, Files={}, Deleted={}, Id={}, GroupedFamilies={}, FamilyTypes={})".format(
@@ -514,113 +756,3 @@ class Family(Object):
 
     def __str__(self):
         return "[{}]: {}".format(self.Id, self.Name)
-
-
-class GroupedFamily:
-    def __init__(
-        self,
-        ChildFamilyId,
-        FamilyTypeId,
-        ChildFamilyName=None,
-        InstanceCount=1,
-        Deleted=False,
-        Sort=0,
-        Width=0,
-        Depth=0,
-        Rotation=0,
-        Parameters=None,
-        ChildModelGroups=None,
-    ):
-        self.ChildFamilyName = ChildFamilyName
-        self.ChildFamilyId = ChildFamilyId
-        self.FamilyTypeId = FamilyTypeId
-        self.InstanceCount = InstanceCount
-        self.Deleted = Deleted
-        self.Sort = Sort
-        self.Width = Width
-        self.Depth = Depth
-        self.Rotation = Rotation
-        if Parameters == None:
-            self.Parameters = []
-        else:
-            self.Parameters = Parameters
-        if ChildModelGroups == None:
-            self.ChildModelGroups = []
-        else:
-            self.ChildModelGroups = ChildModelGroups
-
-    def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
-
-    @classmethod
-    def from_json(cls, json_dict):
-        ChildFamilyId = json_dict.get("ChildFamilyId")
-        FamilyTypeId = json_dict.get("FamilyTypeId")
-        ChildFamilyName = json_dict.get("ChildFamilyId")
-        InstanceCount = json_dict.get("InstanceCount", 1)
-        Deleted = json_dict.get("Deleted", False)
-        Sort = json_dict.get("Sort", 0)
-        Width = json_dict.get("Width", 0)
-        Depth = json_dict.get("Depth", 0)
-        Rotation = json_dict.get("Rotation", 0)
-        Parameters = json_dict.get("Parameters", [])
-        ChildModelGroups = json_dict.get("ChildModelGroups", [])
-
-        return cls(
-            ChildFamilyId,
-            FamilyTypeId,
-            ChildFamilyName,
-            InstanceCount,
-            Deleted,
-            Sort,
-            Width,
-            Depth,
-            Rotation,
-            Parameters,
-            ChildModelGroups,
-        )
-
-    @classmethod
-    def from_service(cls, json_dict):
-        ChildFamilyId = json_dict.get("childFamilyId")
-        ChildFamily = json_dict.get("childFamily")
-        if ChildFamily:
-            ChildFamilyName = ChildFamily.get("familyName")
-            ChildFamilyTypes = ChildFamily.get("FamilyType")
-            if ChildFamilyTypes:
-                FamilyTypeId = ChildFamilyTypes[0].get("familyTypeId")
-
-        InstanceCount = json_dict.get("instanceCount", 1)
-        Sort = json_dict.get("sort", 0)
-        Width = json_dict.get("width", 0)
-        Depth = json_dict.get("depth", 0)
-        Rotation = json_dict.get("rotation", 0)
-        Parameters = json_dict.get("parameters", [])
-
-        return cls(
-            ChildFamilyId,
-            FamilyTypeId,
-            ChildFamilyName,
-            InstanceCount,
-            False,
-            Sort,
-            Width,
-            Depth,
-            Rotation,
-            Parameters,
-        )
-
-    def __repr__(self):
-        return "GroupedFamily(ChildFamilyId={}, FamilyTypeId={}, ChildFamilyName={}, InstanceCount={}, Deleted={}, Sort={}, Width={}, Depth={}, Rotation={}, Parameters={}, ChildModelGroups={})".format(
-            self.ChildFamilyId,
-            self.FamilyTypeId,
-            self.ChildFamilyName,
-            self.InstanceCount,
-            self.Deleted,
-            self.Sort,
-            self.Width,
-            self.Depth,
-            self.Rotation,
-            self.Parameters,
-            self.ChildModelGroups,
-        )
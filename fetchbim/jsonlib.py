@@ -0,0 +1,92 @@
+import json
+
+from . import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKENDS = ("orjson", "msgspec", "json")
+_backend = None
+
+
+def available_backends():
+    """Returns the names of the installed backends, fastest first"""
+    installed = {"orjson": orjson is not None, "msgspec": msgspec is not None, "json": True}
+    return [name for name in BACKENDS if installed[name]]
+
+
+def set_backend(name=None):
+    """Selects the json backend used by loads and dumps
+
+    Args:
+        name (str, optional): "orjson", "msgspec" or "json". Defaults to settings.JSON_BACKEND, then the fastest installed.
+    """
+    global _backend
+    name = name or settings.JSON_BACKEND or available_backends()[0]
+    if name not in available_backends():
+        raise ValueError("JSON backend {} is not installed, choose from {}".format(name, available_backends()))
+    _backend = name
+    return name
+
+
+def get_backend():
+    if _backend is None:
+        set_backend()
+    return _backend
+
+
+def _wrap_default(default):
+    """Lets the fast backends serialize list subclasses such as IndexedList"""
+    if default is None:
+        return None
+
+    def wrapped(o):
+        if isinstance(o, (list, tuple)):
+            return list(o)
+        return default(o)
+
+    return wrapped
+
+
+def loads(data):
+    """Parses json from bytes or str"""
+    backend = get_backend()
+    if backend == "orjson":
+        return orjson.loads(data)
+    if backend == "msgspec":
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj, default=None):
+    """Serializes obj to utf-8 json bytes
+
+    Args:
+        obj: Object to serialize
+        default (callable, optional): Converts objects the backend cannot serialize, e.g. utils.json_default
+    """
+    backend = get_backend()
+    if backend == "orjson":
+        return orjson.dumps(obj, default=_wrap_default(default))
+    if backend == "msgspec":
+        return msgspec.json.encode(obj, enc_hook=_wrap_default(default))
+    return json.dumps(obj, default=default).encode("utf-8")
+
+
+def dumps(obj, default=None):
+    """Serializes obj to a json string"""
+    if get_backend() == "json":
+        return json.dumps(obj, default=default)
+    return dumps_bytes(obj, default).decode("utf-8")
+
+
+def response_json(response):
+    """Parses the body of a requests response with the selected backend"""
+    return loads(response.content)
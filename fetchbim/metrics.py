@@ -0,0 +1,251 @@
+import bisect
+import functools
+import re
+import threading
+import time
+from collections import Counter
+
+from . import jsonlib
+from . import settings
+
+def endpoints():
+    """
+    Returns the settings url templates reported as logical endpoints, most specific first. "{}"
+    matches one path segment, so every family id maps to the same endpoint. The templates are
+    read from settings on every call, so later overrides of the urls are followed.
+    """
+    return (
+        ("QUERY_FAMILIES", settings.QUERY_FAMILIES),
+        ("GET_FULL_FAMILY", settings.GET_FULL_FAMILY),
+        ("GET_FAMILY", settings.GET_FAMILY),
+        ("POST_FAMILY", settings.POST_FAMILY),
+        ("RESTORE_FAMILY", settings.RESTORE_FAMILY),
+        ("DELETE_FAMILY", settings.DELETE_FAMILY),
+        ("UPDATE_FAMILY", settings.UPDATE_FAMILY),
+        ("POST_SHARED_FILE", settings.GET_SHARED_FILE.format("")),
+        ("GET_SHARED_FILE", settings.GET_SHARED_FILE),
+        ("ALL_SHARED_FILES", settings.ALL_SHARED_FILES),
+        ("BS_GET_ALL_FAMILIES", settings.BS_GET_ALL_FAMILIES),
+        ("BS_GET_PUBLIC_FAMILIES", settings.BS_GET_PUBLIC_FAMILIES),
+        ("BS_GET_PAGE", settings.BS_GET_PAGE),
+        ("NOTION_QUERY", settings.NOTION_DATABASE + "{}/query"),
+        ("NOTION_DATABASE", settings.NOTION_DATABASE + "{}"),
+        ("NOTION_PAGE", settings.NOTION_PAGE + "{}"),
+        ("NOTION_PAGE", settings.NOTION_PAGE),
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def _template_pattern(template):
+    return re.compile(re.escape(template).replace(re.escape("{}"), "[^/?]+") + r"/?(\?.*)?$")
+
+
+def endpoint_for(url):
+    """Returns the logical endpoint name of a url, e.g. GET_FULL_FAMILY, or "other" """
+    for name, template in endpoints():
+        if _template_pattern(template).match(url):
+            return name
+    return "other"
+
+
+class BodySize:
+    """
+    Bytes of a request body. Streamed bodies (iterators and async iterators of chunks) are
+    wrapped by `wrap` and counted as they are sent.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def wrap(self, body):
+        if body is None:
+            return body
+        if isinstance(body, str):
+            self.bytes = len(body.encode("utf-8"))
+        elif isinstance(body, (bytes, bytearray)):
+            self.bytes = len(body)
+        elif hasattr(body, "__anext__"):
+            return self._count_async(body)
+        elif hasattr(body, "__next__"):
+            return self._count(body)
+        return body
+
+    def _count(self, chunks):
+        for chunk in chunks:
+            self.bytes += len(chunk)
+            yield chunk
+
+    async def _count_async(self, chunks):
+        async for chunk in chunks:
+            self.bytes += len(chunk)
+            yield chunk
+
+
+class EndpointStats:
+    """Counters of one (endpoint, method) pair"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.count = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency_sum = 0.0
+        # one count per bucket upper bound, plus +Inf
+        self.latency_counts = [0] * (len(buckets) + 1)
+        self.statuses = Counter()
+
+    def observe(self, status, seconds, bytes_out, bytes_in):
+        self.count += 1
+        self.statuses[str(status)] += 1
+        self.latency_sum += seconds
+        self.latency_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.bytes_out += bytes_out
+        self.bytes_in += bytes_in
+
+    def to_dict(self):
+        cumulative = []
+        total = 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.latency_counts):
+            total += count
+            cumulative.append([bound, total])
+        return {
+            "count": self.count,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "statuses": dict(self.statuses),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "latency_sum": self.latency_sum,
+            "latency_buckets": cumulative,
+        }
+
+
+class MetricsRegistry:
+    """
+    Thread-safe request metrics per logical endpoint and method.
+
+    Every request sent by transport.request and AsyncFetchClient is reported here: one
+    observation per attempt with its status (or the exception name), latency and body sizes,
+    plus the number of retries and response cache hits.
+
+    Example:
+        print(metrics.get_registry().to_prometheus())
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(sorted(buckets or settings.METRICS_BUCKETS))
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.started_at = time.time()
+
+    def _get(self, endpoint, method):
+        key = (endpoint, method.upper())
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = EndpointStats(self.buckets)
+        return stats
+
+    def observe(self, endpoint, method, status, seconds, bytes_out=0, bytes_in=0):
+        """Records one attempt
+
+        Args:
+            endpoint (str): Logical endpoint, see endpoint_for
+            method (str): Http method
+            status (int or str): Status code, or the exception name when no response was received
+            seconds (float): Latency of the attempt
+            bytes_out (int, optional): Request body size. Defaults to 0.
+            bytes_in (int, optional): Response body size. Defaults to 0.
+        """
+        with self._lock:
+            self._get(endpoint, method).observe(status, seconds, bytes_out, bytes_in)
+
+    def retry(self, endpoint, method):
+        with self._lock:
+            self._get(endpoint, method).retries += 1
+
+    def cache_hit(self, endpoint, method="GET"):
+        with self._lock:
+            self._get(endpoint, method).cache_hits += 1
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.started_at = time.time()
+
+    def snapshot(self):
+        """Returns every counter as a json serializable dictionary: {endpoint: {method: stats}}"""
+        with self._lock:
+            snapshot = {}
+            for (endpoint, method), stats in sorted(self._stats.items()):
+                snapshot.setdefault(endpoint, {})[method] = stats.to_dict()
+        return {"started_at": self.started_at, "endpoints": snapshot}
+
+    def to_json(self):
+        return jsonlib.dumps(self.snapshot())
+
+    def to_prometheus(self, prefix="fetchbim"):
+        """Returns the counters in the Prometheus text exposition format"""
+        snapshot = self.snapshot()["endpoints"]
+        lines = []
+
+        def family(name, metric_type, help_text):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, metric_type))
+
+        def labels(endpoint, method, **extra):
+            pairs = [("endpoint", endpoint), ("method", method)] + sorted(extra.items())
+            return "{" + ",".join('{}="{}"'.format(key, value) for key, value in pairs) + "}"
+
+        def rows():
+            for endpoint, methods in snapshot.items():
+                for method, stats in methods.items():
+                    yield endpoint, method, stats
+
+        family("requests_total", "counter", "Requests sent, including retries, by status.")
+        for endpoint, method, stats in rows():
+            for status, count in sorted(stats["statuses"].items()):
+                lines.append("{}_requests_total{} {}".format(prefix, labels(endpoint, method, status=status), count))
+        for name, key, help_text in (
+            ("retries_total", "retries", "Requests repeated by the retry policy."),
+            ("cache_hits_total", "cache_hits", "GETs answered by the response cache without a request."),
+            ("request_bytes_total", "bytes_out", "Request body bytes sent."),
+            ("response_bytes_total", "bytes_in", "Response body bytes received."),
+        ):
+            family(name, "counter", help_text)
+            for endpoint, method, stats in rows():
+                lines.append("{}_{}{} {}".format(prefix, name, labels(endpoint, method), stats[key]))
+        family("request_duration_seconds", "histogram", "Request latency.")
+        for endpoint, method, stats in rows():
+            for bound, count in stats["latency_buckets"]:
+                lines.append(
+                    "{}_request_duration_seconds_bucket{} {}".format(prefix, labels(endpoint, method, le=bound), count)
+                )
+            lines.append(
+                "{}_request_duration_seconds_sum{} {}".format(prefix, labels(endpoint, method), stats["latency_sum"])
+            )
+            lines.append(
+                "{}_request_duration_seconds_count{} {}".format(prefix, labels(endpoint, method), stats["count"])
+            )
+        return "\n".join(lines) + "\n"
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Returns the registry requests report to, creating it on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = MetricsRegistry()
+    return _registry
+
+
+def set_registry(registry):
+    """Replaces the registry requests report to, e.g. with a fresh one per job"""
+    global _registry
+    _registry = registry
@@ -1,9 +1,11 @@
 import requests
-import json
-
-from .utils import retry
+import threading
+import time
 
+from . import jsonlib
 from . import settings
+from . import transport
+from .utils import bounded_map
 
 
 def truncate(value, limit=2000):
@@ -121,22 +123,51 @@ class NotionProperty:
 class NotionPage:
     # Create a page
     @staticmethod
-    @retry
     def create(parent_db_name, payload):
         parent_id = settings.NOTION_DATABASE_IDS[parent_db_name]
         payload["parent"] = {"database_id": parent_id}
         url = settings.NOTION_PAGE
-        r = requests.post(url, data=json.dumps(payload), headers=settings.NOTION_HEADERS)
+        r = transport.post(url, data=jsonlib.dumps(payload), headers=settings.NOTION_HEADERS)
         return r
 
     # Update a page
     @staticmethod
-    @retry
     def update(page_id, payload):
         url = settings.NOTION_PAGE + page_id
-        r = requests.patch(url, data=json.dumps(payload), headers=settings.NOTION_HEADERS)
+        r = transport.patch(url, data=jsonlib.dumps(payload), headers=settings.NOTION_HEADERS)
         return r
 
+    @staticmethod
+    def get(page_id):
+        url = settings.NOTION_PAGE + page_id
+        return transport.get(url, headers=settings.NOTION_HEADERS)
+
+    @staticmethod
+    def get_many(page_ids, concurrency=None, cache=None):
+        """Fetches pages concurrently within the Notion rate limit
+
+        Args:
+            page_ids (iterable): Page ids. Duplicates and pages already in the cache are fetched once.
+            concurrency (int, optional): Maximum requests in flight. Defaults to settings.NOTION_RATE_BURST.
+            cache (dict, optional): Page id -> page, filled with the fetched pages. Reuse it across calls
+                so pages shared between them are fetched once.
+
+        Returns:
+            dict: Page id -> page for every page that could be fetched
+        """
+        cache = {} if cache is None else cache
+        page_ids = list(dict.fromkeys(page_ids))
+        missing = [page_id for page_id in page_ids if page_id not in cache]
+        concurrency = concurrency or settings.NOTION_RATE_BURST
+        for page_id, response, error in bounded_map(NotionPage.get, missing, concurrency):
+            if error is None and not response.ok:
+                error = response.text
+            if error is not None:
+                print("Could not get page {}: {}".format(page_id, error))
+                continue
+            cache[page_id] = jsonlib.loads(response.content)
+        return {page_id: cache[page_id] for page_id in page_ids if page_id in cache}
+
     @staticmethod
     def archive(page_id):
         data = {"archived": True}
@@ -147,6 +178,44 @@ class NotionPage:
         data = {"archived": False}
         return NotionPage.update(page_id, data)
 
+    @staticmethod
+    def update_many(page_ids, payload, concurrency=None, on_progress=None):
+        """Applies the same update to many pages concurrently within the Notion rate limit
+
+        Args:
+            page_ids (iterable): Page ids. Consumed lazily, so a generator over query results streams.
+            payload (dict): Update body, e.g. {"archived": True}
+            concurrency (int, optional): Maximum requests in flight. Defaults to settings.NOTION_RATE_BURST.
+            on_progress (callable, optional): Called with (completed, page_id, error) after every page;
+                error is None on success
+
+        Returns:
+            list: (page_id, error) for every page that could not be updated
+        """
+        concurrency = concurrency or settings.NOTION_RATE_BURST
+        failures = []
+        completed = 0
+        update = lambda page_id: NotionPage.update(page_id, payload)
+        for page_id, response, error in bounded_map(update, page_ids, concurrency):
+            if error is None and not response.ok:
+                error = response.text
+            if error is not None:
+                failures.append((page_id, error))
+            completed += 1
+            if on_progress is not None:
+                on_progress(completed, page_id, error)
+        return failures
+
+    @staticmethod
+    def archive_many(page_ids, concurrency=None, on_progress=None):
+        """Archives many pages concurrently. See update_many."""
+        return NotionPage.update_many(page_ids, {"archived": True}, concurrency, on_progress)
+
+    @staticmethod
+    def restore_many(page_ids, concurrency=None, on_progress=None):
+        """Restores many archived pages concurrently. See update_many."""
+        return NotionPage.update_many(page_ids, {"archived": False}, concurrency, on_progress)
+
 
 class NotionFilter:
     def __init__(
@@ -178,21 +247,22 @@ class NotionFilter:
                 self.filter_type: {self.condition: self.value},
             }
 
-    def __repr__(self):
-        return "NotionFilter(value={}, filter_type={}, condition={}, property_name={}".format(
-            self.value, self.filter_type, self.condition, self.property_name
-        )
+    def chunks(self, size=None):
+        """Splits a list value into filters of at most `size` conditions each
 
-    # Query database
-    @retry
-    def query(self, db_name):
-        db_id = settings.NOTION_DATABASE_IDS[db_name]
-        url = settings.NOTION_DATABASE + db_id + "/query"
-
-        cursor = None
-        results = []
-        response = None
-        # notion will only return 100 items at a time. this loops through until there are no more
+        Args:
+            size (int, optional): Defaults to settings.NOTION_MAX_FILTER_CONDITIONS.
+        """
+        size = size or settings.NOTION_MAX_FILTER_CONDITIONS
+        if not isinstance(self.value, list) or len(self.value) <= size:
+            return [self]
+        return [
+            NotionFilter(self.value[start : start + size], self.filter_type, self.condition, self.property_name)
+            for start in range(0, len(self.value), size)
+        ]
+
+    def to_query(self):
+        """Returns the body of a database query using this filter. A value of None matches every page."""
         data = {}
         if self.value is not None:
             filt = self.to_json()
@@ -200,65 +270,286 @@ class NotionFilter:
                 data["filter"] = {"or": filt}
             else:
                 data["filter"] = filt
-        while True:
-            if cursor:
-                data["start_cursor"] = cursor
-            try:
-                r = requests.post(url, data=json.dumps(data), headers=settings.NOTION_HEADERS)
-                r.raise_for_status()
-            except requests.exceptions.HTTPError as errh:
-                print("Http Error:", errh)
-            except requests.exceptions.ConnectionError as errc:
-                print("Error Connecting:", errc)
-            except requests.exceptions.Timeout as errt:
-                print("Timeout Error:", errt)
-            except requests.exceptions.RequestException as err:
-                print("OOps: Something Else", err)
-            else:
-                response_json = r.json()
-                results.extend(response_json["results"])
-                more_pages = response_json["has_more"]
-                if more_pages:
-                    cursor = response_json["next_cursor"]
-                else:
-                    break
+        return data
+
+    def __repr__(self):
+        return "NotionFilter(value={}, filter_type={}, condition={}, property_name={}".format(
+            self.value, self.filter_type, self.condition, self.property_name
+        )
+
+    # Query database
+    def iter_query(self, db_name):
+        """Yields the results of a database query one page (up to 100 results) at a time
+
+        Long value lists are queried one chunk after another, skipping pages already yielded.
+
+        Args:
+            db_name (str): Key of settings.NOTION_DATABASE_IDS
+        """
+        chunks = self.chunks()
+        if len(chunks) == 1:
+            yield from iter_pages(db_name, self.to_query())
+            return
+        seen = set()
+        for chunk in chunks:
+            for results in iter_pages(db_name, chunk.to_query()):
+                yield dedupe_pages([results], seen)
+
+    def query(self, db_name, concurrency=None):
+        """Returns every page matching the filter
+
+        Long value lists are split into chunks that are queried concurrently, within the
+        Notion rate limit, and merged by page id.
+
+        Args:
+            db_name (str): Key of settings.NOTION_DATABASE_IDS
+            concurrency (int, optional): Maximum chunk queries in flight. Defaults to settings.NOTION_RATE_BURST.
+        """
+        chunks = self.chunks()
+        if len(chunks) == 1:
+            return [page for results in iter_pages(db_name, self.to_query()) for page in results]
+        concurrency = concurrency or settings.NOTION_RATE_BURST
+        chunk_results = {}
+        query_chunk = lambda i: [page for results in iter_pages(db_name, chunks[i].to_query()) for page in results]
+        for i, results, error in bounded_map(query_chunk, range(len(chunks)), concurrency):
+            if error is not None:
+                raise error
+            chunk_results[i] = results
+        return dedupe_pages(chunk_results[i] for i in range(len(chunks)))
+
+    async def aiter_query(self, db_name, client=None):
+        """Async version of iter_query that requests the next page while the caller processes the current one
+
+        Args:
+            db_name (str): Key of settings.NOTION_DATABASE_IDS
+            client (AsyncFetchClient, optional): Client to query with. Defaults to a new client for this query.
+        """
+        seen = set()
+        for chunk in self.chunks():
+            async for results in aiter_pages(db_name, chunk.to_query(), client=client):
+                yield dedupe_pages([results], seen)
+
+
+def dedupe_pages(result_lists, seen=None):
+    """Merges lists of pages, keeping the first page with each id
+
+    Args:
+        result_lists (iterable): Lists of Notion page objects
+        seen (set, optional): Ids already returned, updated in place. Defaults to a new set.
+    """
+    seen = set() if seen is None else seen
+    pages = []
+    for results in result_lists:
+        for page in results:
+            if page["id"] not in seen:
+                seen.add(page["id"])
+                pages.append(page)
+    return pages
+
 
-        return results
+def iter_pages(db_name, data=None, filter_properties=None):
+    """Yields the results of a database query one page at a time, following next_cursor
+
+    Transient failures are retried by the transport. Any other failure is printed and raised
+    rather than repeating the same cursor forever.
+
+    Args:
+        db_name (str): Key of settings.NOTION_DATABASE_IDS
+        data (dict, optional): Query body, e.g. NotionFilter.to_query(). Defaults to every page.
+        filter_properties (list, optional): Property ids to return on each page. Defaults to all properties.
+    """
+    url = settings.NOTION_DATABASE + settings.NOTION_DATABASE_IDS[db_name] + "/query"
+    params = {"filter_properties": filter_properties} if filter_properties else None
+    data = dict(data or {})
+    while True:
+        try:
+            r = transport.post(url, data=jsonlib.dumps(data), headers=settings.NOTION_HEADERS, params=params)
+            r.raise_for_status()
+        except requests.exceptions.HTTPError as errh:
+            print("Http Error:", errh)
+            raise
+        except requests.exceptions.RequestException as err:
+            print("Error querying {}: {}".format(db_name, err))
+            raise
+        response_json = jsonlib.loads(r.content)
+        yield response_json["results"]
+        if not response_json["has_more"]:
+            return
+        data["start_cursor"] = response_json["next_cursor"]
+
+
+async def aiter_pages(db_name, data=None, filter_properties=None, client=None):
+    """Async version of iter_pages. See AsyncFetchClient.notion_pages."""
+    if client is None:
+        from .client import AsyncFetchClient
+
+        async with AsyncFetchClient() as client:
+            async for results in client.notion_pages(db_name, data, filter_properties):
+                yield results
+        return
+
+    async for results in client.notion_pages(db_name, data, filter_properties):
+        yield results
 
 
 class NotionDatabase:
     @staticmethod
-    @retry
-    def get_all(db_name):
-        db_id = settings.NOTION_DATABASE_IDS[db_name]
-        url = settings.NOTION_DATABASE + db_id + "/query"
-        headers = settings.NOTION_HEADERS
-        cursor = None
-        results = []
-        response = None
-        data = {}
+    def get(db_name):
+        """Returns the database object, including its property schema"""
+        url = settings.NOTION_DATABASE + settings.NOTION_DATABASE_IDS[db_name]
+        r = transport.get(url, headers=settings.NOTION_HEADERS)
+        r.raise_for_status()
+        return jsonlib.loads(r.content)
 
-        while True:
-            if cursor:
-                data["start_cursor"] = cursor
-            try:
-                r = requests.post(url, data=json.dumps(data), headers=headers)
-                r.raise_for_status()
-            except requests.exceptions.HTTPError as errh:
-                print("Http Error:", errh)
-            except requests.exceptions.ConnectionError as errc:
-                print("Error Connecting:", errc)
-            except requests.exceptions.Timeout as errt:
-                print("Timeout Error:", errt)
-            except requests.exceptions.RequestException as err:
-                print("OOps: Something Else", err)
-            else:
-                response_json = r.json()
-                results.extend(response_json["results"])
-                more_pages = response_json["has_more"]
-                if more_pages:
-                    cursor = response_json["next_cursor"]
-                else:
-                    break
-
-        return results
+    @staticmethod
+    def property_ids(db_name, property_names):
+        """Returns the ids of the named database properties, as used by filter_properties"""
+        schema = NotionDatabase.get(db_name)["properties"]
+        return [schema[name]["id"] for name in property_names]
+
+    @staticmethod
+    def iter_all(db_name, filter_properties=None):
+        """Yields every page of a database, one page of results at a time
+
+        Args:
+            db_name (str): Key of settings.NOTION_DATABASE_IDS
+            filter_properties (list, optional): Property ids to return on each page. Defaults to all properties.
+        """
+        return iter_pages(db_name, filter_properties=filter_properties)
+
+    @staticmethod
+    def get_all(db_name, filter_properties=None):
+        """Returns every page of a database
+
+        Args:
+            db_name (str): Key of settings.NOTION_DATABASE_IDS
+            filter_properties (list, optional): Property ids to return on each page. Defaults to all properties.
+        """
+        return [page for results in iter_pages(db_name, filter_properties=filter_properties) for page in results]
+
+    @staticmethod
+    async def aiter_all(db_name, filter_properties=None, client=None):
+        """Async version of iter_all that requests the next page while the caller processes the current one"""
+        async for results in aiter_pages(db_name, filter_properties=filter_properties, client=client):
+            yield results
+
+
+def _index_key(properties, property_name):
+    """
+    Returns the value a page is indexed by. A title or rich text is the plain_text of every segment
+    joined, the whole value Notion's equals filter compares, where get_property only reads the first.
+    """
+    prop = properties.get(property_name)
+    if prop and prop.get("type") in ("title", "rich_text"):
+        segments = prop[prop["type"]] or []
+        text = "".join(x.get("plain_text") or x.get("text", {}).get("content", "") for x in segments)
+        return text or None
+    return NotionProperty.get_property(properties, property_name)
+
+
+class NotionIndex:
+    """
+    In-memory index of the pages of a Notion database keyed by the value of one property.
+    """
+
+    def __init__(self, db_name, property_name, ttl=None):
+        self.db_name = db_name
+        self.property_name = property_name
+        self.ttl = ttl
+        self.loaded_at = None
+        self._pages = {}
+
+    def load(self):
+        """Downloads every page of the database, with only the indexed property, and rebuilds the index"""
+        try:
+            filter_properties = NotionDatabase.property_ids(self.db_name, [self.property_name])
+        except (requests.exceptions.RequestException, KeyError) as e:
+            print("Could not read the {} schema, downloading every property: {}".format(self.db_name, e))
+            filter_properties = None
+        pages = {}
+        for page in NotionDatabase.get_all(self.db_name, filter_properties):
+            key = _index_key(page["properties"], self.property_name)
+            if key is not None:
+                pages.setdefault(key, []).append(page["id"])
+        self._pages = pages
+        self.loaded_at = time.monotonic()
+        return self
+
+    @property
+    def expired(self):
+        if self.loaded_at is None:
+            return True
+        return self.ttl is not None and time.monotonic() - self.loaded_at > self.ttl
+
+    def get(self, value, default=None):
+        """Returns the ids of the pages whose property equals value"""
+        return self._pages.get(value, default)
+
+    def add(self, value, page_id):
+        """Adds a page to the index, e.g. after creating it"""
+        page_ids = self._pages.setdefault(value, [])
+        if page_id not in page_ids:
+            page_ids.append(page_id)
+
+    def __contains__(self, value):
+        return value in self._pages
+
+    def __len__(self):
+        return len(self._pages)
+
+    def __repr__(self):
+        return "NotionIndex(db_name={}, property_name={}, ttl={}, keys={})".format(
+            self.db_name, self.property_name, self.ttl, len(self)
+        )
+
+
+class RelationResolver:
+    """
+    Resolves relation values to Notion page ids from NotionIndexes instead of one query per value.
+    Each database is downloaded once and refreshed after `ttl` seconds.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = settings.NOTION_RELATION_TTL if ttl is None else ttl
+        self.indexes = {}
+        self._lock = threading.Lock()
+
+    def index(self, db_name, property_name):
+        """Returns the index of db_name keyed by property_name, loading or refreshing it if needed"""
+        key = (db_name, property_name)
+        with self._lock:
+            index = self.indexes.get(key)
+            if index is None:
+                index = self.indexes[key] = NotionIndex(db_name, property_name, self.ttl)
+            if index.expired:
+                index.load()
+        return index
+
+    def preload(self, relations=None):
+        """Loads every lookup database up front
+
+        Args:
+            relations (dict, optional): Database name -> property name. Defaults to settings.NOTION_RELATION_KEYS.
+        """
+        if relations is None:
+            relations = settings.NOTION_RELATION_KEYS
+        for db_name, property_name in relations.items():
+            self.index(db_name, property_name)
+        return self
+
+    def resolve(self, db_name, property_name, value):
+        """Returns the pages matching value, or any value of a list, as [{"id": page_id}] like NotionFilter.query
+
+        Args:
+            db_name (str): Key of settings.NOTION_DATABASE_IDS
+            property_name (str): Property to match
+            value (str or list): Value or values to match
+        """
+        index = self.index(db_name, property_name)
+        values = value if isinstance(value, list) else [value]
+        page_ids = []
+        for v in values:
+            for page_id in index.get(v, []):
+                if page_id not in page_ids:
+                    page_ids.append(page_id)
+        return [{"id": page_id} for page_id in page_ids]
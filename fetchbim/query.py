@@ -1,11 +1,11 @@
-import requests
-import json
-
+from . import jsonlib
 from . import settings
+from . import transport
 from .family import Family
-from .notion import NotionProperty, NotionPage, NotionFilter, PropertyType, Condition
+from .notion import NotionProperty, NotionPage, NotionFilter, NotionIndex, PropertyType, Condition
 from .attributes import Parameter, File
-from .utils import retry
+from .admin import iter_families
+from .utils import bounded_map, json_default, schema_from_json
 from enum import Enum
 
 
@@ -49,15 +49,14 @@ class Filter(object):
         return cls(PropertyName=name, PropertyValue="", PropertyValueMatchType=3)
 
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return jsonlib.dumps(self, default=json_default)
 
-    @retry
     def query(self):
         url = settings.QUERY_FAMILIES
         data = self.to_json()
         headers = settings.BIM_HEADERS
-        response = requests.post(url, data=data, headers=headers)
-        return response.json()
+        response = transport.post(url, data=data, headers=headers)
+        return jsonlib.loads(response.content)
 
     def get_ids(self):
         id_list = []
@@ -66,6 +65,12 @@ class Filter(object):
             id_list.append(fam["Id"])
         return id_list
 
+    def __and__(self, other):
+        return CompoundFilter.combine("and", self, other)
+
+    def __or__(self, other):
+        return CompoundFilter.combine("or", self, other)
+
     def __repr__(self):
         return "Filter(FamilyObjectType={}, CategoryName={}, ParameterName={}, ParameterValue={}, ParameterValueMatchType={}, PropertyName={}, PropertyValue={}, PropertyValueMatchType={}, FileKey={})".format(
             self.FamilyObjectType,
@@ -93,11 +98,146 @@ class Filter(object):
             for param in parameters:
                 if param["Name"] in name_list:
                     param["Deleted"] = True
-            requests.post(
+            transport.post(
                 settings.POST_FAMILY,
-                data=json.dumps(response),
+                data=jsonlib.dumps(response),
                 headers=settings.BIM_HEADERS,
             )
+            transport.invalidate(settings.GET_FULL_FAMILY.format(id_))
+
+
+def _upsert_notion(db_name, property_name, key, data, index=None):
+    """Updates the page of db_name whose numeric property equals key, or creates it"""
+    if index is not None:
+        exists = [{"id": page_id} for page_id in index.get(key, [])]
+    else:
+        exists_filter = NotionFilter(key, filter_type=PropertyType.NUMBER, property_name=property_name)
+        exists = exists_filter.query(db_name)
+    if exists:
+        return NotionPage.update(exists[0].get("id"), data)
+    response = NotionPage.create(db_name, data)
+    if index is not None and response.ok:
+        index.add(key, jsonlib.loads(response.content)["id"])
+    return response
+
+
+class CompoundFilter(object):
+    """AND/OR combination of Filters, built with & and |
+
+    The api only answers one condition per query, so every distinct leaf Filter is queried
+    once, concurrently, and the results are combined as sets of family ids.
+
+    Example:
+        chairs = Filter(CategoryName="Furniture") & (Filter.prop_exists("Seat Height") | Filter(FileKey="FBX"))
+        for family in chairs.families():
+            ...
+    """
+
+    OPERATORS = ("and", "or")
+
+    def __init__(self, operator, filters):
+        if operator not in self.OPERATORS:
+            raise ValueError("operator must be one of {}".format(self.OPERATORS))
+        self.operator = operator
+        self.filters = list(filters)
+
+    @classmethod
+    def combine(cls, operator, left, right):
+        if not isinstance(right, (Filter, CompoundFilter)):
+            return NotImplemented
+        filters = []
+        for f in (left, right):
+            # (a & b) & c flattens to one node
+            if isinstance(f, CompoundFilter) and f.operator == operator:
+                filters.extend(f.filters)
+            else:
+                filters.append(f)
+        return cls(operator, filters)
+
+    def __and__(self, other):
+        return CompoundFilter.combine("and", self, other)
+
+    def __or__(self, other):
+        return CompoundFilter.combine("or", self, other)
+
+    def leaves(self):
+        """Returns the distinct leaf Filters, keyed by their request body"""
+        leaves = {}
+        for f in self.filters:
+            if isinstance(f, CompoundFilter):
+                leaves.update(f.leaves())
+            else:
+                leaves.setdefault(f.to_json(), f)
+        return leaves
+
+    def run(self, concurrency=10):
+        """Queries every leaf Filter concurrently
+
+        Args:
+            concurrency (int, optional): Maximum queries in flight. Defaults to 10.
+
+        Returns:
+            dict: Leaf request body -> list of family summaries
+        """
+        leaves = self.leaves()
+        results = {}
+        for key, families, error in bounded_map(lambda key: leaves[key].query(), leaves, concurrency):
+            if error is None and not isinstance(families, list):
+                error = ValueError("Unexpected query response for {}: {}".format(leaves[key], families))
+            if error is not None:
+                print("Query failed for {}: {}".format(leaves[key], error))
+                raise error
+            results[key] = families
+        return results
+
+    def evaluate(self, results):
+        """Combines leaf results as id sets
+
+        Args:
+            results (dict): Output of run()
+        """
+        id_sets = []
+        for f in self.filters:
+            if isinstance(f, CompoundFilter):
+                id_sets.append(f.evaluate(results))
+            else:
+                id_sets.append({fam["Id"] for fam in results[f.to_json()]})
+        if not id_sets:
+            return set()
+        if self.operator == "and":
+            return set.intersection(*id_sets)
+        return set.union(*id_sets)
+
+    def query(self, concurrency=10):
+        """Returns the family summaries matching the whole filter
+
+        Args:
+            concurrency (int, optional): Maximum leaf queries in flight. Defaults to 10.
+        """
+        results = self.run(concurrency)
+        ids = self.evaluate(results)
+        summaries = {}
+        for families in results.values():
+            for fam in families:
+                if fam["Id"] in ids:
+                    summaries.setdefault(fam["Id"], fam)
+        return list(summaries.values())
+
+    def get_ids(self, concurrency=10):
+        return list(self.evaluate(self.run(concurrency)))
+
+    def families(self, concurrency=10, on_error=None, lazy=False):
+        """Yields full Family objects for the matching ids only
+
+        Args:
+            concurrency (int, optional): Maximum requests in flight. Defaults to 10.
+            on_error (callable, optional): See admin.iter_families
+            lazy (bool, optional): See admin.iter_families
+        """
+        return iter_families(self.get_ids(concurrency), concurrency, on_error=on_error, lazy=lazy)
+
+    def __repr__(self):
+        return "CompoundFilter({}, {})".format(self.operator, self.filters)
 
 
 class SharedFile(Filter):
@@ -143,56 +283,60 @@ class SharedFile(Filter):
         self.NotionPageId = None
         self.NotionParentId = None
 
-    @retry
     def post(self):
         data = self.to_json()
         url = settings.GET_SHARED_FILE.format("")
         headers = settings.BIM_HEADERS
-        response = requests.post(url, data=data, headers=headers)
+        response = transport.post(url, data=data, headers=headers)
         if response.status_code in range(200, 299):
-            results = response.json()
-
-            self.Description = results.get("Description", "")
-            self.FamilyObjectType = results.get("FamilyObjectType")
-            self.CategoryName = results.get("CategoryName", "")
-            self.ParameterName = results.get("ParameterName")
-            self.ParameterValue = results.get("ParameterValue")
-            self.ParameterValueMatchType = results.get("ParameterValueMatchType")
-            self.PropertyName = results.get("PropertyName")
-            self.PropertyValue = results.get("PropertyValue")
-            self.PropertyValueMatchType = results.get("PropertyValueMatchType")
-            self.FileKey = results.get("FileKey")
-            self.Deleted = results.get("Deleted", False)
-            self.SharedFileId = results.get("SharedFileId", 0)
-            self.Files = []
-            for file in results.get("Files", []):
-                self.Files.append(File.from_json(file))
-            for attr in self.Attributes:
-                for attribute in results.get("Attributes", []):
-                    if attr.Name == attribute["Name"]:
-                        attr.SharedAttributeId = attribute["SharedAttributeId"]
+            self.update_from_json(jsonlib.loads(response.content))
+            transport.invalidate(settings.GET_SHARED_FILE.format(str(self.SharedFileId)))
         else:
             print(response.text)
         return response
 
+    def update_from_json(self, results):
+        """Updates the shared file in place from the admin api response to a post
+
+        Args:
+            results (dict): Shared file json returned by the api
+        """
+        self.Description = results.get("Description", "")
+        self.FamilyObjectType = results.get("FamilyObjectType")
+        self.CategoryName = results.get("CategoryName", "")
+        self.ParameterName = results.get("ParameterName")
+        self.ParameterValue = results.get("ParameterValue")
+        self.ParameterValueMatchType = results.get("ParameterValueMatchType")
+        self.PropertyName = results.get("PropertyName")
+        self.PropertyValue = results.get("PropertyValue")
+        self.PropertyValueMatchType = results.get("PropertyValueMatchType")
+        self.FileKey = results.get("FileKey")
+        self.Deleted = results.get("Deleted", False)
+        self.SharedFileId = results.get("SharedFileId", 0)
+        self.Files = []
+        for file in results.get("Files", []):
+            self.Files.append(File.from_json(file))
+        for attr in self.Attributes:
+            for attribute in results.get("Attributes", []):
+                if attr.Name == attribute["Name"]:
+                    attr.SharedAttributeId = attribute["SharedAttributeId"]
+
     @staticmethod
-    @retry
     def get_all():
         url = settings.ALL_SHARED_FILES
         headers = settings.BIM_HEADERS
-        response = requests.get(url, headers=headers)
+        response = transport.get(url, headers=headers)
         if response.status_code in range(200, 299):
-            response_json = response.json()
+            response_json = jsonlib.loads(response.content)
             return response_json.get("SharedFiles", [])
 
     @classmethod
-    @retry
     def get_json(cls, SharedFileId):
         url = settings.GET_SHARED_FILE.format(str(SharedFileId))
         headers = settings.BIM_HEADERS
-        response = requests.get(url, headers=headers)
+        response = transport.cached_get(url, headers=headers)
         if response.status_code in range(200, 299):
-            return response.json()
+            return jsonlib.loads(response.content)
 
     @classmethod
     def from_json(cls, SharedFileId):
@@ -231,8 +375,12 @@ class SharedFile(Filter):
             Attributes,
         )
 
-    @retry
-    def to_notion(self):
+    def notion_payload(self, attribute_pages=None):
+        """Returns the Shared Rules page payload
+
+        Args:
+            attribute_pages (list, optional): Shared Attributes pages ({"id": ...}) to relate the rule to
+        """
         data = {"properties": {}}
         data["archived"] = False
         NotionProperty.set_property(data, self.Description, "Description", property_type="title")
@@ -254,24 +402,110 @@ class SharedFile(Filter):
             value = "Contains"
         # NotionProperty.set_property(data, value, "ParameterValueMatchType", "select")
         NotionProperty.set_property(data, value, "MatchType", property_type="select")
+        if attribute_pages:
+            NotionProperty.set_property(data, attribute_pages, "SharedAttributes", property_type="relation")
+        return data
+
+    def upsert_notion(self, data, index=None):
+        """Creates or updates the rule's Shared Rules page
+
+        Args:
+            data (dict): Payload from notion_payload
+            index (NotionIndex, optional): Shared Rules pages by SharedFileId, used instead of querying for the page
+        """
+        return _upsert_notion("Shared Rules", "SharedFileId", self.SharedFileId, data, index)
+
+    def to_notion(self):
         SharedAttributes = []
-        if self.Attributes:
-            for attribute in self.Attributes:
-                response = attribute.to_notion()
-                response_json = response.json()
-                SharedAttributes.append(response_json)
-            NotionProperty.set_property(data, SharedAttributes, "SharedAttributes", property_type="relation")
-
-        exists_filter = NotionFilter(self.SharedFileId, filter_type=PropertyType.NUMBER, property_name="SharedFileId")
-        exists = exists_filter.query("Shared Rules")
-        if exists:
-            r = NotionPage.update(exists[0].get("id"), data)
-        else:
-            r = NotionPage.create("Shared Rules", data)
+        for attribute in self.Attributes or []:
+            response = attribute.to_notion()
+            SharedAttributes.append(jsonlib.loads(response.content))
+        return self.upsert_notion(self.notion_payload(SharedAttributes))
+
+    @staticmethod
+    def sync_notion(shared_files, concurrency=None):
+        """Creates or updates the Shared Rules and Shared Attributes pages of many shared files
+
+        Both databases are indexed by their numeric ids once, attributes shared by several rules
+        are written once, and all upserts run concurrently within the Notion rate limit. Attributes
+        without a SharedAttributeId (0, not saved to the admin api yet) each get a page of their own.
+
+        Args:
+            shared_files (list): SharedFile objects, e.g. from SharedFile.from_json
+            concurrency (int, optional): Maximum writes in flight. Defaults to settings.NOTION_RATE_BURST.
+
+        Returns:
+            dict: {"attributes": written, "rules": written, "failed": [(object, error), ...]}
+        """
+        concurrency = concurrency or settings.NOTION_RATE_BURST
+        indexes = [NotionIndex("Shared Attributes", "SharedAttributeId"), NotionIndex("Shared Rules", "SharedFileId")]
+        for index, _, error in bounded_map(NotionIndex.load, indexes, len(indexes)):
+            if error is not None:
+                raise error
+        attribute_index, rule_index = indexes
+
+        attributes = {}
+        unsaved = []
+        for shared_file in shared_files:
+            for attribute in shared_file.Attributes or []:
+                if attribute.SharedAttributeId:
+                    attributes.setdefault(attribute.SharedAttributeId, attribute)
+                else:
+                    unsaved.append(attribute)
+
+        summary = {"attributes": 0, "rules": 0, "failed": []}
+        # Page ids of the unsaved attributes, keyed by the attribute object since they share id 0
+        unsaved_pages = {}
+
+        def upsert_attribute(attribute):
+            data = attribute.notion_payload()
+            if not attribute.SharedAttributeId:
+                # there is no id to match an existing page on
+                return NotionPage.create("Shared Attributes", data)
+            return attribute.upsert_notion(data, attribute_index)
+
+        to_write = list(attributes.values()) + unsaved
+        for attribute, response, error in bounded_map(upsert_attribute, to_write, concurrency):
+            if error is None and not response.ok:
+                error = response.text
+            if error is not None:
+                print("Could not write shared attribute {}: {}".format(attribute, error))
+                summary["failed"].append((attribute, error))
+                continue
+            summary["attributes"] += 1
+            if not attribute.SharedAttributeId:
+                unsaved_pages[id(attribute)] = jsonlib.loads(response.content)["id"]
+
+        def upsert_rule(shared_file):
+            attribute_pages = []
+            for attribute in shared_file.Attributes or []:
+                if attribute.SharedAttributeId:
+                    page_ids = attribute_index.get(attribute.SharedAttributeId)
+                    page_id = page_ids[0] if page_ids else None
+                else:
+                    page_id = unsaved_pages.get(id(attribute))
+                if page_id:
+                    attribute_pages.append({"id": page_id})
+            return shared_file.upsert_notion(shared_file.notion_payload(attribute_pages), rule_index)
+
+        for shared_file, response, error in bounded_map(upsert_rule, shared_files, concurrency):
+            if error is None and not response.ok:
+                error = response.text
+            if error is not None:
+                print("Could not write shared rule {}: {}".format(shared_file.SharedFileId, error))
+                summary["failed"].append((shared_file, error))
+            else:
+                summary["rules"] += 1
+        return summary
 
     @classmethod
-    @retry
-    def from_notion(cls, json_dict):
+    def from_notion(cls, json_dict, page_cache=None):
+        """Builds a SharedFile from its Shared Rules page, fetching the related attribute pages concurrently
+
+        Args:
+            json_dict (dict): Shared Rules page
+            page_cache (dict, optional): Page id -> page, see NotionPage.get_many. Pages already in it are not fetched.
+        """
         NotionPageId = json_dict["id"]
         NotionParentId = json_dict["parent"]["database_id"]
         props = json_dict["properties"]
@@ -287,15 +521,10 @@ class SharedFile(Filter):
         AttributesProp = NotionProperty.get_property(props, "SharedAttributes")
         Attributes = []
         if AttributesProp:
+            pages = NotionPage.get_many(AttributesProp, cache=page_cache)
             for id_ in AttributesProp:
-                url = settings.NOTION_PAGE + id_
-                response = requests.get(url, headers=settings.NOTION_HEADERS)
-                if response.status_code in range(200, 299):
-                    results = response.json()
-                    shared_attribute = SharedAttribute.from_notion(results)
-                    Attributes.append(shared_attribute)
-                else:
-                    print(response.text)
+                if id_ in pages:
+                    Attributes.append(SharedAttribute.from_notion(pages[id_]))
 
         shared_file = cls(
             Description=Description,
@@ -318,17 +547,44 @@ class SharedFile(Filter):
 
         return shared_file
 
+    @classmethod
+    def from_notion_many(cls, pages, concurrency=None, page_cache=None):
+        """Builds SharedFiles from many Shared Rules pages
+
+        The attribute pages of every rule are fetched together, concurrently, and each shared
+        attribute only once.
+
+        Args:
+            pages (list): Shared Rules pages, e.g. NotionFilter(None).query("Shared Rules")
+            concurrency (int, optional): Maximum requests in flight. Defaults to settings.NOTION_RATE_BURST.
+            page_cache (dict, optional): Page id -> page, see NotionPage.get_many
+        """
+        page_cache = {} if page_cache is None else page_cache
+        attribute_ids = []
+        for page in pages:
+            attribute_ids.extend(NotionProperty.get_property(page["properties"], "SharedAttributes") or [])
+        NotionPage.get_many(attribute_ids, concurrency, page_cache)
+        return [cls.from_notion(page, page_cache) for page in pages]
+
     @staticmethod
-    @retry
-    def archive_notion(db_name):
-        no_filter = NotionFilter(None)
-        results = no_filter.query(db_name)
-        for r in results:
-            NotionPage.archive(r["id"])
+    def archive_notion(db_name, concurrency=None, on_progress=None):
+        """Archives every page of a database, streaming page ids from the query into concurrent updates
+
+        Args:
+            db_name (str): Key of settings.NOTION_DATABASE_IDS
+            concurrency (int, optional): Maximum requests in flight. Defaults to settings.NOTION_RATE_BURST.
+            on_progress (callable, optional): See NotionPage.update_many
+
+        Returns:
+            list: (page_id, error) for every page that could not be archived
+        """
+        page_ids = (page["id"] for results in NotionFilter(None).iter_query(db_name) for page in results)
+        return NotionPage.archive_many(page_ids, concurrency, on_progress)
 
     @staticmethod
-    def archive_db(id_list):
-        pass
+    def archive_db(id_list, concurrency=None, on_progress=None):
+        """Archives the Notion pages in id_list concurrently. See NotionPage.update_many."""
+        return NotionPage.archive_many(id_list, concurrency, on_progress)
 
     def __repr__(self):
         return "SharedFile(Description={}, FamilyObjectType={}, CategoryName={}, ParameterName={}, ParameterValue={}, ParameterValueMatchType={}, PropertyName={}, PropertyValue={}, PropertyValueMatchType={}, FileKey={}, Deleted={}, SharedFileId={}, Files={}, Attributes={})".format(
@@ -350,6 +606,8 @@ class SharedFile(Filter):
 
 
 class SharedAttribute(Parameter):
+    _schema = Parameter._schema + (("AttributeType", None), ("SharedAttributeId", 0))
+
     def __init__(
         self,
         Name,
@@ -371,37 +629,13 @@ class SharedAttribute(Parameter):
 
     @classmethod
     def from_json(cls, json_dict):
-        Name = json_dict.get("Name", "")
-        Value = json_dict.get("Value", "")
-        Deleted = json_dict.get("Deleted", False)
-        DataType = json_dict.get("DataType")
-        ParameterType = json_dict.get("ParameterType")
-        Sort = json_dict.get("Sort")
-        Hidden = json_dict.get("Hidden", False)
-        ParameterId = json_dict.get("ParameterId", 0)
-        AttributeType = json_dict.get("AttributeType")
-        SharedAttributeId = json_dict.get("SharedAttributeId", 0)
-        NotionPageId = json_dict.get("NotionPageId")
-        NotionParentId = json_dict.get("NotionParentId")
-
-        shared_attr = cls(
-            Name,
-            Value,
-            Deleted,
-            DataType,
-            ParameterType,
-            Sort,
-            Hidden,
-            ParameterId,
-            AttributeType,
-            SharedAttributeId,
-        )
-        shared_attr.NotionPageId = NotionPageId
-        shared_attr.NotionParentId = NotionParentId
-
+        shared_attr = schema_from_json(cls, json_dict)
+        shared_attr.NotionPageId = json_dict.get("NotionPageId")
+        shared_attr.NotionParentId = json_dict.get("NotionParentId")
         return shared_attr
 
-    def to_notion(self):
+    def notion_payload(self):
+        """Returns the Shared Attributes page payload"""
         data = {"properties": {}}
         data["archived"] = False
         data["properties"]["SharedAttributeId"] = {"number": self.SharedAttributeId}
@@ -421,19 +655,19 @@ class SharedAttribute(Parameter):
             NotionProperty.set_property(data, self.ParameterType, "ParameterType", "select")
         NotionProperty.set_property(data, self.Sort, "Sort", "number")
         NotionProperty.set_property(data, self.Hidden, "Hidden", "checkbox")
+        return data
 
-        # print(data)
-        # print(self.NotionPageId)
+    def upsert_notion(self, data, index=None):
+        """Creates or updates the attribute's Shared Attributes page
 
-        exists_filter = NotionFilter(
-            self.SharedAttributeId, filter_type=PropertyType.NUMBER, property_name="SharedAttributeId"
-        )
-        exists = exists_filter.query("Shared Attributes")
-        if exists:
-            return NotionPage.update(exists[0].get("id"), data)
-        else:
-            return NotionPage.create("Shared Attributes", data)
-        # print(r.json())
+        Args:
+            data (dict): Payload from notion_payload
+            index (NotionIndex, optional): Shared Attributes pages by SharedAttributeId, used instead of querying for the page
+        """
+        return _upsert_notion("Shared Attributes", "SharedAttributeId", self.SharedAttributeId, data, index)
+
+    def to_notion(self):
+        return self.upsert_notion(self.notion_payload())
 
     @classmethod
     def from_notion(cls, json_dict):
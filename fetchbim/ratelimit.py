@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+
+from . import settings
+from .utils import host_prefix
+
+
+class RateLimiter:
+    """
+    Token bucket shared by synchronous and asynchronous callers.
+
+    Each request takes a token; tokens refill at `rate` per second up to `burst`.
+    A 429 halves the rate and pauses every caller for the Retry-After time, then
+    each successful response raises the rate by `recovery` until it is back at `max_rate`.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None, recovery=None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.min_rate = float(min_rate or rate / 10.0)
+        self.recovery = float(recovery or rate / 20.0)
+        self.throttled = 0
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Takes a token and returns how long the caller has to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = 0.0
+            if self._tokens < 0:
+                wait = -self._tokens / self.rate
+            return max(wait, self._blocked_until - now)
+
+    def _blocked_for(self):
+        with self._lock:
+            return self._blocked_until - time.monotonic()
+
+    def acquire(self):
+        """Blocks until a request may be sent"""
+        wait = self._reserve()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._blocked_for()
+
+    async def acquire_async(self):
+        """Waits without blocking the event loop until a request may be sent"""
+        wait = self._reserve()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._blocked_for()
+
+    def observe(self, status, retry_after=None):
+        """Adapts the rate to a response
+
+        Args:
+            status (int): Response status code
+            retry_after (float, optional): Seconds from the Retry-After header
+        """
+        with self._lock:
+            if status == 429:
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate / 2.0)
+                if retry_after is None:
+                    retry_after = 1.0 / self.rate
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                self._tokens = min(self._tokens, 0.0)
+            elif 200 <= status < 300 and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.recovery)
+
+    def __repr__(self):
+        return "RateLimiter(rate={}, burst={}, max_rate={}, throttled={})".format(
+            self.rate, self.burst, self.max_rate, self.throttled
+        )
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_missing = object()
+
+
+def get_limiter(url):
+    """Returns the limiter shared by every request to the host of url, or None if the host is not limited
+
+    Args:
+        url (str): Request url
+    """
+    prefix = host_prefix(url)
+    limiter = _limiters.get(prefix, _missing)
+    if limiter is _missing:
+        with _limiters_lock:
+            limiter = _limiters.get(prefix, _missing)
+            if limiter is _missing:
+                limiter = None
+                for base_url, (rate, burst) in settings.RATE_LIMITS.items():
+                    if host_prefix(base_url) == prefix:
+                        limiter = RateLimiter(rate, burst)
+                        break
+                _limiters[prefix] = limiter
+    return limiter
+
+
+def set_limiter(url, limiter):
+    """Replaces the limiter used for the host of url. Pass None to remove it.
+
+    Args:
+        url (str): Any url on the host
+        limiter (RateLimiter): New limiter
+    """
+    with _limiters_lock:
+        _limiters[host_prefix(url)] = limiter
@@ -1,4 +1,13 @@
 import asyncio
+import functools
+import inspect
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from . import settings
+
+# Marks the end of the stream on a queue between stages
+_done = object()
 
 
 async def run_sequence(*functions):
@@ -7,4 +16,173 @@ async def run_sequence(*functions):
 
 
 async def run_parallel(*functions):
-    asyncio.gather(*functions)
+    return await asyncio.gather(*functions)
+
+
+def _report_error(stage, item, error):
+    print("Stage {} failed for {}: {}".format(stage.name, item, error))
+
+
+class Stage:
+    """
+    One step of a Pipeline: a function applied to every item with at most `concurrency` calls in flight.
+
+    Coroutine functions are awaited; plain functions run in the loop's default thread pool so
+    blocking calls do not stall the other stages. A result of None drops the item, so a stage
+    can also filter.
+
+    Args:
+        func (callable): Function of one item
+        concurrency (int, optional): Maximum calls in flight. Defaults to 1.
+        name (str, optional): Used in error reports. Defaults to the function name.
+    """
+
+    def __init__(self, func, concurrency=1, name=None):
+        self.func = func
+        self.concurrency = concurrency
+        self.name = name or getattr(func, "__name__", repr(func))
+        self.is_async = inspect.iscoroutinefunction(func)
+
+    async def call(self, item):
+        if self.is_async:
+            return await self.func(item)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.func, item))
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return "Stage(name={}, concurrency={})".format(self.name, self.concurrency)
+
+
+class ProcessStage(Stage):
+    """
+    A Stage for CPU-bound work that runs its function in a pool of worker processes, so it uses
+    more than the event loop's core. The function must be picklable, i.e. defined at module level,
+    and so must its input and output; see the transform module.
+
+    Args:
+        func (callable): Module level function of one item
+        workers (int, optional): Worker processes. Defaults to settings.TRANSFORM_WORKERS, then one per CPU.
+        executor (ProcessPoolExecutor, optional): Pool to share between stages. It is not shut down by the stage.
+        name (str, optional): Used in error reports. Defaults to the function name.
+    """
+
+    def __init__(self, func, workers=None, executor=None, name=None):
+        workers = workers or settings.TRANSFORM_WORKERS
+        self.workers = workers
+        self.executor = executor
+        self._owns_executor = executor is None
+        # keep every worker busy plus one item queued per worker
+        super(ProcessStage, self).__init__(func, concurrency=2 * (workers or os.cpu_count() or 1), name=name)
+
+    async def call(self, item):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.func, item)
+
+    def close(self):
+        """Shuts down the worker processes if the stage started them"""
+        if self._owns_executor and self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def __repr__(self):
+        return "ProcessStage(name={}, workers={})".format(self.name, self.workers)
+
+
+class Pipeline:
+    """
+    Runs items through stages connected by bounded queues.
+
+    Every stage works on items as soon as the previous stage hands them over, instead of
+    waiting for the whole batch like chained gather calls. When a downstream stage falls
+    behind, the queues fill up and the upstream stages pause, so memory stays bounded
+    end to end.
+
+    Example:
+        pipeline = Pipeline(
+            Stage(client.get_family, concurrency=10),
+            Stage(Family.from_json, concurrency=2),
+            Stage(client.post_notion, concurrency=3),
+        )
+        results = await pipeline.run(family_ids)
+
+    Args:
+        *stages (Stage or callable): Callables are wrapped in a Stage with a concurrency of 1
+        queue_size (int, optional): Items buffered between two stages. Defaults to settings.PIPELINE_QUEUE_SIZE.
+        on_error (callable, optional): Called with (stage, item, exception) when a stage fails for an item,
+            which is then dropped. Defaults to printing the error.
+    """
+
+    def __init__(self, *stages, queue_size=None, on_error=None):
+        self.stages = [stage if isinstance(stage, Stage) else Stage(stage) for stage in stages]
+        self.queue_size = settings.PIPELINE_QUEUE_SIZE if queue_size is None else queue_size
+        self.on_error = on_error or _report_error
+
+    async def _feed(self, items, queue):
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await queue.put(item)
+            else:
+                for item in items:
+                    await queue.put(item)
+        except Exception:
+            # end the stream even when the input fails, so the stages drain instead of waiting forever
+            await queue.put(_done)
+            raise
+        await queue.put(_done)
+
+    async def _work(self, stage, inbox, outbox):
+        while True:
+            item = await inbox.get()
+            if item is _done:
+                # pass the marker on so the other workers of this stage stop too
+                await inbox.put(_done)
+                return
+            try:
+                result = await stage.call(item)
+            except Exception as e:
+                self.on_error(stage, item, e)
+                continue
+            if result is not None:
+                await outbox.put(result)
+
+    async def _run_stage(self, stage, inbox, outbox):
+        await asyncio.gather(*(self._work(stage, inbox, outbox) for _ in range(stage.concurrency)))
+        await outbox.put(_done)
+
+    async def stream(self, items):
+        """Yields the results of the last stage as they complete
+
+        Args:
+            items (iterable or async iterable): Inputs of the first stage, consumed only as the first queue has room
+        """
+        queues = [asyncio.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        tasks = [asyncio.ensure_future(self._feed(items, queues[0]))]
+        for stage, inbox, outbox in zip(self.stages, queues, queues[1:]):
+            tasks.append(asyncio.ensure_future(self._run_stage(stage, inbox, outbox)))
+        try:
+            while True:
+                result = await queues[-1].get()
+                if result is _done:
+                    break
+                yield result
+            # surface errors raised outside of the stage functions, e.g. by the input iterable
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for stage in self.stages:
+                stage.close()
+
+    async def run(self, items):
+        """Runs every item through the pipeline and returns the results of the last stage in completion order"""
+        return [result async for result in self.stream(items)]
+
+    def __repr__(self):
+        return "Pipeline(stages={}, queue_size={})".format(self.stages, self.queue_size)
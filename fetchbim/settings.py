@@ -94,3 +94,95 @@ NOTION_DATABASE_IDS = {
     "Shared Attributes": "b734013d16164030a941e07ff000d0a5",
     "Learning Resources": "a31f04fce2e44b8982fd15d1734cf17f",
 }
+
+# HTTP TRANSPORT
+# Keep-alive connection pools shared by every request. POOL_CONNECTIONS is the
+# number of host pools to cache, POOL_MAXSIZE the default number of connections
+# kept open per host. POOL_HOST_LIMITS overrides the per-host size.
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 10
+POOL_BLOCK = False
+POOL_HOST_LIMITS = {
+    BIM_BASE_URL: 20,
+    BS_BASE_URL: 20,
+    NOTION_BASE_URL: 10,
+}
+
+# Connection limits for AsyncFetchClient's aiohttp session: total open
+# connections, and connections per host.
+ASYNC_POOL_LIMIT = 100
+ASYNC_POOL_LIMIT_PER_HOST = POOL_MAXSIZE
+
+# RATE LIMITS
+# Requests per second and burst size per host. Notion allows an average of
+# three requests per second per integration.
+NOTION_RATE_LIMIT = 3
+NOTION_RATE_BURST = 3
+RATE_LIMITS = {
+    NOTION_BASE_URL: (NOTION_RATE_LIMIT, NOTION_RATE_BURST),
+}
+
+# Notion rejects compound filters with more conditions than this. Longer
+# NotionFilter value lists are split into chunks queried concurrently.
+NOTION_MAX_FILTER_CONDITIONS = 100
+
+# RETRIES
+# Transient failures (connection errors, timeouts and the statuses below) are
+# retried with exponential backoff and jitter, honoring Retry-After.
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 0.5
+RETRY_MAX_BACKOFF = 30.0
+RETRY_JITTER = 0.5
+RETRY_STATUSES = (429, 502, 503, 504)
+RETRY_DEADLINE = 120.0
+
+# Notion lookup databases used for Family relations, and the property each is
+# matched on. RelationResolver loads these once and refreshes them after
+# NOTION_RELATION_TTL seconds.
+NOTION_RELATION_KEYS = {
+    "Revit Categories": "Category",
+    "BIMobject Omniclass": "code",
+    "BIMobject Categories": "Combined Name",
+    "BIMobject IFC": "name",
+    "BIMobject Masterformat2014": "name",
+    "BIMobject Uniformat2": "name",
+    "Content Calendar": "SSGFID",
+}
+NOTION_RELATION_TTL = 3600
+
+# Local file holding the hash of the last payload synced to Notion per SSGFID
+SYNC_STATE_PATH = os.environ.get("FETCHBIM_SYNC_STATE", "notion_sync_state.json")
+
+# RESPONSE CACHE
+# Opt-in on-disk cache for full family and shared file GETs, enabled with
+# transport.enable_cache(). Entries older than CACHE_TTL seconds are
+# revalidated, and the least recently used are evicted past CACHE_MAX_BYTES.
+CACHE_PATH = os.environ.get("FETCHBIM_CACHE", "fetchbim_cache.sqlite")
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# LOCAL CATALOG
+# sqlite snapshot of the full family records used by catalog.Catalog to answer
+# Filter queries offline.
+CATALOG_PATH = os.environ.get("FETCHBIM_CATALOG", "fetchbim_catalog.sqlite")
+
+# Items buffered between two stages of a sequence.Pipeline. A full queue pauses
+# the stages before it.
+PIPELINE_QUEUE_SIZE = 100
+
+# REQUEST METRICS
+# Every request is recorded in metrics.get_registry() per logical endpoint:
+# counts by status, retries, bytes and a latency histogram with these bucket
+# upper bounds in seconds.
+METRICS_ENABLED = True
+METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Worker processes of a sequence.ProcessStage. None uses one per CPU.
+TRANSFORM_WORKERS = None
+
+# Bytes of a file base64 encoded at a time when File data is serialized. Must
+# be a multiple of 3 so the chunks can be concatenated.
+FILE_CHUNK_SIZE = 3 * 256 * 1024
+
+# JSON backend: "orjson", "msgspec" or "json". Defaults to the fastest installed.
+JSON_BACKEND = os.environ.get("FETCHBIM_JSON_BACKEND")
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+
+from . import settings
+from .notion import NotionIndex
+
+
+def payload_hash(payload):
+    """Returns a stable sha256 hex digest of a json payload
+
+    Args:
+        payload (dict): Notion page payload
+    """
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class SyncState:
+    """
+    Hash of the last payload written to Notion for each key (SSGFID), kept in a local json file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or settings.SYNC_STATE_PATH
+        self.hashes = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            self.load()
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.hashes = json.load(f).get("hashes", {})
+        return self
+
+    def save(self):
+        """Writes the state to disk, replacing the previous file only once the write succeeds"""
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            data = {"hashes": dict(self.hashes)}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key, default=None):
+        """Returns the hash recorded for key"""
+        return self.hashes.get(key, default)
+
+    def set(self, key, digest):
+        with self._lock:
+            self.hashes[key] = digest
+
+    def changed(self, key, payload):
+        """Returns True if payload differs from the last one recorded for key"""
+        return self.hashes.get(key) != payload_hash(payload)
+
+    def update(self, key, payload):
+        self.set(key, payload_hash(payload))
+
+    def forget(self, key):
+        with self._lock:
+            self.hashes.pop(key, None)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __repr__(self):
+        return "SyncState(path={}, keys={})".format(self.path, len(self))
+
+
+def content_calendar_index(resolver=None):
+    """Returns the Content Calendar pages indexed by SSGFID, shared with the resolver if one is given"""
+    if resolver is not None:
+        return resolver.index("Content Calendar", "SSGFID")
+    return NotionIndex("Content Calendar", "SSGFID").load()
+
+
+def sync_families(families, state=None, resolver=None, save=True, index=None):
+    """Posts families to the Content Calendar, skipping those whose payload has not changed since the last run.
+
+    Existing pages are found in one SSGFID index of the Content Calendar instead of one query per family.
+
+    Args:
+        families (iterable): Family objects, e.g. from admin.iter_families
+        state (SyncState, optional): Defaults to the state stored at settings.SYNC_STATE_PATH.
+        resolver (RelationResolver, optional): Resolve relations without querying Notion per family
+        save (bool, optional): Save the state when done. Defaults to True.
+        index (NotionIndex, optional): Content Calendar pages by SSGFID. Defaults to content_calendar_index(resolver).
+    """
+    if state is None:
+        state = SyncState()
+    if index is None:
+        index = content_calendar_index(resolver)
+    counts = {"written": 0, "skipped": 0, "failed": 0}
+    try:
+        for family in families:
+            try:
+                response = family.post_notion(resolver=resolver, state=state, index=index)
+            except Exception as e:
+                # one bad family must not stop the run; it is retried on the next sync
+                counts["failed"] += 1
+                print("Could not sync family {}: {}".format(family.Id, e))
+                continue
+            if response is None:
+                counts["skipped"] += 1
+            elif response.ok:
+                counts["written"] += 1
+            else:
+                counts["failed"] += 1
+                print("Could not sync family {}: {}".format(family.Id, response.text))
+    finally:
+        if save:
+            state.save()
+    return counts
@@ -0,0 +1,55 @@
+"""
+CPU-bound family transformations meant to run in worker processes.
+
+Every function takes a raw family dictionary, as returned by admin.get_family, and returns a
+small picklable result, so only plain json crosses the process boundary in either direction.
+Use them with sequence.ProcessStage, or any concurrent.futures.ProcessPoolExecutor.
+"""
+from .family import Family
+from .notion import NotionProperty, PropertyType
+
+
+def notion_payload(family_json):
+    """Builds the Content Calendar payload of a family without its relations
+
+    Returns:
+        tuple: (family id, payload, relations), where relations is a tuple of
+            (db_name, prop_name, field_name, value) lookups still to be resolved. See apply_relations.
+    """
+    family = Family.from_json(family_json)
+    payload = family.to_notion(relations=False)
+    relations = tuple(
+        (relation["db_name"], relation["prop_name"], relation["field_name"], relation["value"])
+        for relation in family.relation_properties()
+        if relation["value"]
+    )
+    return family.Id, payload, relations
+
+
+def apply_relations(payload, relations, resolver):
+    """Fills in the relation properties of a notion_payload result in place, from a preloaded RelationResolver"""
+    for db_name, prop_name, field_name, value in relations:
+        pages = resolver.resolve(db_name, prop_name, value)
+        NotionProperty.set_property(payload, pages, field_name, property_type=PropertyType.RELATION)
+    return payload
+
+
+def summary(family_json):
+    """Parses a family into a flat summary of its name, category, properties, parameters and file keys"""
+    family = Family.from_json(family_json)
+    parameters = {p.Name: p.Value for p in family.Parameters if not p.Deleted}
+    for family_type in family.FamilyTypes:
+        for p in family_type.Parameters:
+            if not p.Deleted:
+                parameters.setdefault(p.Name, p.Value)
+    return {
+        "Id": family.Id,
+        "Name": family.Name,
+        "CategoryName": family.CategoryName,
+        "FamilyObjectType": family.FamilyObjectType,
+        "Deleted": family.Deleted,
+        "Properties": {p.Name: p.Value for p in family.Properties if not p.Deleted},
+        "Parameters": parameters,
+        "FileKeys": sorted({f.FileKey for f in family.Files if not f.Deleted}),
+        "FamilyTypes": [family_type.Name for family_type in family.FamilyTypes],
+    }
@@ -0,0 +1,244 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from . import settings
+from .cache import ResponseCache
+from .ratelimit import get_limiter
+from .utils import BodyError, BodyGuard, RetryPolicy, host_prefix, retry_after_seconds
+
+_session = None
+_lock = threading.Lock()
+_retry_policy = None
+_cache = None
+
+
+def build_session(pool_connections=None, pool_maxsize=None, host_limits=None, pool_block=None):
+    """Returns a requests.Session with a keep-alive connection pool mounted for each known host
+
+    Args:
+        pool_connections (int, optional): Number of host pools to cache. Defaults to settings.POOL_CONNECTIONS.
+        pool_maxsize (int, optional): Connections kept per host. Defaults to settings.POOL_MAXSIZE.
+        host_limits (dict, optional): Url -> pool size overrides. Defaults to settings.POOL_HOST_LIMITS.
+        pool_block (bool, optional): Block instead of opening extra connections. Defaults to settings.POOL_BLOCK.
+    """
+    if pool_connections is None:
+        pool_connections = settings.POOL_CONNECTIONS
+    if pool_maxsize is None:
+        pool_maxsize = settings.POOL_MAXSIZE
+    if host_limits is None:
+        host_limits = settings.POOL_HOST_LIMITS
+    if pool_block is None:
+        pool_block = settings.POOL_BLOCK
+
+    session = requests.Session()
+    default_adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+    for url, limit in host_limits.items():
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=limit, pool_block=pool_block)
+        session.mount(host_prefix(url), adapter)
+    return session
+
+
+def build_retry_policy():
+    """Returns a RetryPolicy using the settings.RETRY_* values"""
+    return RetryPolicy(
+        max_attempts=settings.RETRY_MAX_ATTEMPTS,
+        backoff=settings.RETRY_BACKOFF,
+        max_backoff=settings.RETRY_MAX_BACKOFF,
+        jitter=settings.RETRY_JITTER,
+        retry_statuses=settings.RETRY_STATUSES,
+        deadline=settings.RETRY_DEADLINE,
+    )
+
+
+def get_retry_policy():
+    """Returns the retry policy shared by every request, creating it on first use"""
+    global _retry_policy
+    if _retry_policy is None:
+        _retry_policy = build_retry_policy()
+    return _retry_policy
+
+
+def set_retry_policy(policy):
+    """Replaces the retry policy shared by every request
+
+    Args:
+        policy (RetryPolicy): New policy. None rebuilds it from settings on next use.
+    """
+    global _retry_policy
+    _retry_policy = policy
+
+
+def get_session():
+    """Returns the shared session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def configure(pool_connections=None, pool_maxsize=None, host_limits=None, pool_block=None):
+    """Replaces the shared session with one using the given pool sizes. Open connections are closed.
+
+    Args:
+        pool_connections (int, optional): Number of host pools to cache
+        pool_maxsize (int, optional): Connections kept per host
+        host_limits (dict, optional): Url -> pool size overrides
+        pool_block (bool, optional): Block instead of opening extra connections
+    """
+    global _session
+    session = build_session(pool_connections, pool_maxsize, host_limits, pool_block)
+    with _lock:
+        old, _session = _session, session
+    if old is not None:
+        old.close()
+    return session
+
+
+def close():
+    """Closes every pooled connection. The next request opens a new session."""
+    global _session
+    with _lock:
+        old, _session = _session, None
+    if old is not None:
+        old.close()
+
+
+def request(method, url, retry_policy=None, endpoint=None, **kwargs):
+    """Sends a request through the shared session. Accepts the same arguments as requests.request.
+
+    Requests to rate limited hosts (settings.RATE_LIMITS) wait for the host's limiter. Connection
+    errors and transient statuses are retried with the shared RetryPolicy, or retry_policy if given.
+    `data` may be a callable returning the body, e.g. a generator for a chunked upload; it is
+    called again for every attempt. Errors raised while building or reading the body, e.g. an
+    OSError from a file being streamed, are raised as they are and never retried. String bodies
+    are sent as utf-8, since the fast json backends do not escape non-ascii characters.
+
+    Every attempt is recorded in the metrics registry under `endpoint`, which defaults to the
+    settings url the request matches (see metrics.endpoint_for).
+    """
+    limiter = get_limiter(url)
+    data = kwargs.pop("data", None)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    registry = metrics.get_registry() if settings.METRICS_ENABLED else None
+    endpoint = endpoint or metrics.endpoint_for(url)
+    attempts = [0]
+
+    def send():
+        if limiter is not None:
+            limiter.acquire()
+        guard = BodyGuard()
+        body = guard.build(data)
+        if registry is not None and attempts[0]:
+            registry.retry(endpoint, method)
+        attempts[0] += 1
+        sent = metrics.BodySize()
+        start = time.monotonic()
+        try:
+            response = get_session().request(method, url, data=sent.wrap(body), **kwargs)
+        except Exception as e:
+            if registry is not None:
+                registry.observe(endpoint, method, type(e).__name__, time.monotonic() - start, sent.bytes)
+            guard.check(e)
+            raise
+        if registry is not None:
+            if kwargs.get("stream"):
+                received = int(response.headers.get("Content-Length") or 0)
+            else:
+                received = len(response.content)
+            registry.observe(endpoint, method, response.status_code, time.monotonic() - start, sent.bytes, received)
+        if limiter is not None:
+            limiter.observe(response.status_code, retry_after_seconds(response.headers))
+        return response
+
+    try:
+        return (retry_policy or get_retry_policy()).call(send)
+    except BodyError as e:
+        raise e.error from None
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, data=None, **kwargs):
+    return request("POST", url, data=data, **kwargs)
+
+
+def patch(url, data=None, **kwargs):
+    return request("PATCH", url, data=data, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+def enable_cache(path=None, ttl=None, max_bytes=None):
+    """Turns on the on-disk cache used by cached_get and returns it
+
+    Args:
+        path (str, optional): sqlite file. Defaults to settings.CACHE_PATH.
+        ttl (float, optional): Seconds before an entry is revalidated. Defaults to settings.CACHE_TTL.
+        max_bytes (int, optional): Size bound for LRU eviction. Defaults to settings.CACHE_MAX_BYTES.
+    """
+    global _cache
+    disable_cache()
+    _cache = ResponseCache(path, ttl, max_bytes)
+    return _cache
+
+
+def disable_cache():
+    global _cache
+    cache, _cache = _cache, None
+    if cache is not None:
+        cache.close()
+
+
+def get_cache():
+    """Returns the active ResponseCache, or None when caching is off"""
+    return _cache
+
+
+def invalidate(url):
+    """Removes url from the cache, if caching is on"""
+    if _cache is not None:
+        _cache.invalidate(url)
+
+
+def cached_get(url, **kwargs):
+    """GET through the response cache when it is enabled, otherwise the same as get.
+
+    Fresh entries are returned without a request. Stale entries are revalidated with their
+    ETag / Last-Modified and reused on a 304.
+    """
+    cache = _cache
+    if cache is None:
+        return get(url, **kwargs)
+
+    entry = cache.get(url)
+    if entry is not None and cache.is_fresh(entry):
+        if settings.METRICS_ENABLED:
+            metrics.get_registry().cache_hit(kwargs.get("endpoint") or metrics.endpoint_for(url))
+        return cache.to_response(entry)
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+    response = get(url, headers=headers, **kwargs)
+    if response.status_code == 304 and entry is not None:
+        cache.touch(url)
+        return cache.to_response(entry)
+    if response.ok:
+        cache.put(url, response)
+    return response
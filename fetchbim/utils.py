@@ -1,16 +1,380 @@
+import asyncio
+import functools
+import inspect
+import itertools
+import random
+import threading
 import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
 import requests
 
 
-def retry(func, retries=3):
-    def retry_wrapper(*args, **kwargs):
-        attempts = 0
-        while attempts < retries:
+def host_prefix(url):
+    """Returns the scheme and host of a url, e.g. 'https://api.notion.com/'
+
+    Args:
+        url (str): Any url on the host
+    """
+    parts = urlsplit(url)
+    return "{}://{}/".format(parts.scheme, parts.netloc)
+
+
+def retry_after_seconds(headers, default=None):
+    """Returns the Retry-After header in seconds. The header can be a number of seconds or an http date.
+
+    Args:
+        headers (dict): Response headers
+        default (float, optional): Returned when the header is missing or invalid. Defaults to None.
+    """
+    value = headers.get("Retry-After") if headers else None
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def fields_dict(o):
+    """Returns the serialized attributes of a slotted model object: its _fields, then any instance __dict__
+
+    The model classes use __slots__ to keep the full catalog small in memory (samples/memory_benchmark.py
+    measures it), so _fields lists what is serialized, in order.
+    """
+    data = {field: getattr(o, field) for field in o._fields}
+    data.update(getattr(o, "__dict__", {}))
+    return data
+
+
+@functools.lru_cache(maxsize=None)
+def _schema_columns(cls):
+    keys = tuple(entry[0] for entry in cls._schema)
+    defaults = tuple(entry[1] for entry in cls._schema)
+    lists = tuple((i, entry[2].from_json) for i, entry in enumerate(cls._schema) if len(entry) > 2)
+    return keys, defaults, lists
+
+
+def schema_from_json(cls, json_dict):
+    """Builds cls from json using its _schema, one (json key, default) pair per leading constructor argument.
+
+    A third item class, as in ("Files", None, File), marks a list built with item_class.from_json; an
+    empty or missing list passes the default.
+    """
+    keys, defaults, lists = _schema_columns(cls)
+    args = list(map(json_dict.get, keys, defaults))
+    for i, from_json in lists:
+        args[i] = [from_json(item) for item in args[i]] if args[i] else defaults[i]
+    return cls(*args)
+
+
+def json_default(o):
+    """json.dumps default for model objects: their to_dict() if they have one, otherwise their attributes"""
+    to_dict = getattr(o, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    return o.__dict__
+
+
+RETRY_STATUSES = (429, 502, 503, 504)
+RETRY_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    aiohttp.ClientConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+def _status(result):
+    """Returns the status code of a requests or aiohttp response, None for anything else"""
+    status = getattr(result, "status_code", None)
+    if status is None:
+        status = getattr(result, "status", None)
+    return status if isinstance(status, int) else None
+
+
+class BodyError(Exception):
+    """Carries an exception raised by a request body through RetryPolicy.call, which does not retry it"""
+
+    def __init__(self, error):
+        super(BodyError, self).__init__(error)
+        self.error = error
+
+
+class BodyGuard:
+    """
+    Builds a request body and keeps the exception its chunks raise while they are sent.
+
+    HTTP clients report an error raised inside a chunked body, e.g. a file that can't be read, as
+    a connection error, which the RetryPolicy would retry with the same broken body. Errors of the
+    body are raised as a BodyError instead, so the caller can unwrap and raise them at once.
+    """
+
+    def __init__(self):
+        self.error = None
+
+    def build(self, data):
+        """Returns the body of one attempt
+
+        Args:
+            data: Body, or a callable returning it. Iterators and async iterators of chunks are guarded.
+        """
+        try:
+            body = data() if callable(data) else data
+        except Exception as e:
+            raise BodyError(e) from e
+        if hasattr(body, "__anext__"):
+            return self._guard_async(body)
+        if hasattr(body, "__next__"):
+            return self._guard(body)
+        return body
+
+    def _guard(self, chunks):
+        try:
+            yield from chunks
+        except Exception as e:
+            self.error = e
+            raise
+
+    async def _guard_async(self, chunks):
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            self.error = e
+            raise
+
+    def check(self, error):
+        """Raises a BodyError if the body failed, whatever `error` the http client raised for it"""
+        if self.error is not None:
+            raise BodyError(self.error) from error
+
+
+class RetryPolicy:
+    """
+    Decides when a call is retried and how long to wait in between.
+
+    A call is retried when it raises one of `retry_exceptions`, or returns a response whose status
+    is in `retry_statuses`. The wait grows exponentially from `backoff` up to `max_backoff`, with up
+    to `jitter` of it randomized, and is never shorter than the response's Retry-After header.
+    No attempt starts after `deadline` seconds. When attempts run out the last response is returned
+    or the last exception is raised.
+
+    Counts of calls, retries (by reason) and give ups are kept in `stats`.
+    """
+
+    def __init__(
+        self,
+        max_attempts=3,
+        backoff=0.5,
+        max_backoff=30.0,
+        jitter=0.5,
+        retry_statuses=RETRY_STATUSES,
+        retry_exceptions=RETRY_EXCEPTIONS,
+        deadline=None,
+        on_retry=None,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.deadline = deadline
+        self.on_retry = on_retry
+        self.stats = Counter()
+        # the transport's policy is shared by bounded_map worker threads
+        self._lock = threading.Lock()
+
+    def _count(self, *keys):
+        with self._lock:
+            for key in keys:
+                self.stats[key] += 1
+
+    def delay(self, attempt, retry_after=None):
+        """Returns the seconds to wait after a failed attempt
+
+        Args:
+            attempt (int): Number of the attempt that failed, starting at 1
+            retry_after (float, optional): Seconds the server asked to wait
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        delay -= delay * self.jitter * random.random()
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def should_retry(self, result=None, error=None):
+        """Returns the retry reason for a result or exception, or None if it should not be retried"""
+        if error is not None:
+            if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+                return self.should_retry(result=error.response)
+            if isinstance(error, self.retry_exceptions):
+                return type(error).__name__
+            return None
+        status = _status(result)
+        if status in self.retry_statuses:
+            return "status:{}".format(status)
+        return None
+
+    def _next_delay(self, attempt, started, result, error):
+        """Returns the wait before the next attempt, or None to stop"""
+        reason = self.should_retry(result, error)
+        if reason is None:
+            return None
+        if attempt >= self.max_attempts:
+            self._count("giveups")
+            return None
+        retry_after = retry_after_seconds(getattr(result, "headers", None))
+        delay = self.delay(attempt, retry_after)
+        if self.deadline is not None and time.monotonic() + delay - started > self.deadline:
+            self._count("giveups")
+            return None
+        self._count("retries", "retry:" + reason)
+        if self.on_retry is not None:
+            self.on_retry(reason, attempt, delay)
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        """Calls func, retrying according to the policy"""
+        self._count("calls")
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                return func(*args, **kwargs)
-            except requests.exceptions.RequestException as e:
-                print(e)
-                time.sleep(2)
-                attempts += 1
+                result = func(*args, **kwargs)
+            except Exception as e:
+                delay = self._next_delay(attempt, started, None, e)
+                if delay is None:
+                    raise
+            else:
+                delay = self._next_delay(attempt, started, result, None)
+                if delay is None:
+                    return result
+            time.sleep(delay)
+
+    async def call_async(self, func, *args, **kwargs):
+        """Awaits func, retrying according to the policy without blocking the event loop"""
+        self._count("calls")
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._next_delay(attempt, started, None, e)
+                if delay is None:
+                    raise
+            else:
+                delay = self._next_delay(attempt, started, result, None)
+                if delay is None:
+                    return result
+            await asyncio.sleep(delay)
+
+    def __call__(self, func):
+        """Decorates a function or coroutine function with the policy"""
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_retry_wrapper(*args, **kwargs):
+                return await self.call_async(func, *args, **kwargs)
+
+            return async_retry_wrapper
+
+        @functools.wraps(func)
+        def retry_wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+
+        return retry_wrapper
+
+    def __repr__(self):
+        return "RetryPolicy(max_attempts={}, backoff={}, max_backoff={}, jitter={}, retry_statuses={}, deadline={})".format(
+            self.max_attempts, self.backoff, self.max_backoff, self.jitter, sorted(self.retry_statuses), self.deadline
+        )
+
+
+def retry(func=None, retries=3, **kwargs):
+    """Retries a function or coroutine function with a RetryPolicy.
+
+    Usable bare (@retry) or with RetryPolicy arguments (@retry(retries=5, deadline=60)).
+
+    Args:
+        retries (int, optional): Maximum attempts. Defaults to 3.
+    """
+    policy = RetryPolicy(max_attempts=retries, **kwargs)
+    if func is None:
+        return policy
+    return policy(func)
+
+
+def bounded_map(func, iterable, concurrency=10):
+    """Calls func on every item in a thread pool with at most `concurrency` calls in flight.
+
+    Yields (item, result, error) tuples in completion order. Items are pulled from the
+    iterable only as slots free up, so memory scales with concurrency.
+
+    Args:
+        func (callable): Function of one item
+        iterable (iterable): Items to call func with
+        concurrency (int, optional): Maximum calls in flight. Defaults to 10.
+    """
+    items = iter(iterable)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    pending = {}
+    try:
+        for item in itertools.islice(items, concurrency):
+            pending[executor.submit(func, item)] = item
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+                for item in itertools.islice(items, 1):
+                    pending[executor.submit(func, item)] = item
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+async def async_bounded_map(func, iterable, concurrency=10):
+    """Awaits func on every item with at most `concurrency` coroutines in flight.
+
+    Yields (item, result, error) tuples in completion order.
 
-    return retry_wrapper
+    Args:
+        func (coroutine function): Coroutine function of one item
+        iterable (iterable): Items to call func with
+        concurrency (int, optional): Maximum coroutines in flight. Defaults to 10.
+    """
+    items = iter(iterable)
+    pending = {}
+    try:
+        for item in itertools.islice(items, concurrency):
+            pending[asyncio.ensure_future(func(item))] = item
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                item = pending.pop(task)
+                try:
+                    yield item, task.result(), None
+                except Exception as e:
+                    yield item, None, e
+                for item in itertools.islice(items, 1):
+                    pending[asyncio.ensure_future(func(item))] = item
+    finally:
+        for task in pending:
+            task.cancel()
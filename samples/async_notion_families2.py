@@ -1,19 +1,17 @@
 import asyncio
 import time
 
-from aiohttp import ClientSession
-from fetchbim.admin import async_get_family
+from fetchbim.admin import async_iter_families
 from fetchbim.bimservice import get_ids
-from fetchbim.family import Family
-from fetchbim.teams import sync_complete_msg
+from fetchbim.client import AsyncFetchClient
 
 
 async def main(family_ids, sem_count=10):
-    tasks = []
-    async with ClientSession() as session:
-        for family_id in family_ids:
-            tasks.append(asyncio.create_task(async_get_family(family_id, session)))
-        families = await asyncio.gather(*tasks)
+    families = []
+    async with AsyncFetchClient() as client:
+        async for family in async_iter_families(family_ids, concurrency=sem_count, client=client):
+            print(family.Name)
+            families.append(family.Id)
 
         return families
 
@@ -25,6 +23,3 @@ if __name__ == "__main__":
     families = asyncio.get_event_loop().run_until_complete(main(family_ids))
 
     print("--- %s seconds ---" % (time.time() - start_time))
-
-    for fam in families:
-        print(fam["Name"])
@@ -0,0 +1,102 @@
+"""
+Compares the memory of a synthetic catalog held as the slotted model classes
+against the same objects with a per-instance __dict__ (the layout the classes
+had before __slots__), mirrored with types.SimpleNamespace.
+
+The slotted figure includes the name indexes of the IndexedList collections,
+which the plain-list copies do not have, so the net saving is smaller than the
+slots alone give; the index cost is reported on its own line.
+
+    python samples/memory_benchmark.py 2000
+"""
+import sys
+import tracemalloc
+from types import SimpleNamespace
+
+from fetchbim.containers import IndexedList
+from fetchbim.family import Family
+
+
+def family_json(i, parameters=60, properties=20, types=10, type_parameters=40):
+    return {
+        "Id": "00000000-0000-0000-0000-{:012d}".format(i),
+        "Name": "Family {}".format(i),
+        "Status": 0,
+        "LoadMethod": 0,
+        "CategoryName": "Casework",
+        "FamilyObjectType": "Family",
+        "Deleted": False,
+        "Properties": [{"Name": "Property {}".format(p), "Value": "Value {}".format(p), "Id": p} for p in range(properties)],
+        "Parameters": [
+            {"Name": "Parameter {}".format(p), "Value": str(p), "DataType": "Text", "ParameterType": "Type", "Sort": p}
+            for p in range(parameters)
+        ],
+        "Files": [
+            {"FileNameWithExtension": "family{}.rfa".format(i), "FileKey": "FamilyRevitFile", "FileData": "x"},
+            {"FileNameWithExtension": "family{}.jpg".format(i), "FileKey": "FamilyImageLarge", "FileData": "x"},
+        ],
+        "GroupedFamilies": [],
+        "FamilyTypes": [
+            {
+                "Id": "type-{}-{}".format(i, t),
+                "Name": "Type {}".format(t),
+                "Parameters": [
+                    {"Name": "Type Parameter {}".format(p), "Value": str(t * p), "DataType": "Length", "Sort": p}
+                    for p in range(type_parameters)
+                ],
+            }
+            for t in range(types)
+        ],
+    }
+
+
+def to_namespace(o):
+    """Copies a model object into SimpleNamespaces, one __dict__ per instance like the unslotted classes"""
+    if isinstance(o, list):
+        return [to_namespace(x) for x in o]
+    fields = getattr(type(o), "_fields", None)
+    if fields is None:
+        return o
+    return SimpleNamespace(**{field: to_namespace(getattr(o, field)) for field in fields})
+
+
+def drop_indexes(o):
+    """Empties the index of every IndexedList under a model object"""
+    if isinstance(o, IndexedList):
+        o._indexes = {}
+    if isinstance(o, list):
+        for x in o:
+            drop_indexes(x)
+        return
+    for field in getattr(type(o), "_fields", ()):
+        drop_indexes(getattr(o, field))
+
+
+def measure(label, build, payloads):
+    tracemalloc.start()
+    catalog = [build(payload) for payload in payloads]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:<12} {:>10.1f} MB".format(label, current / 1024 / 1024))
+    return catalog, current
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    payloads = [family_json(i) for i in range(count)]
+    objects = 1 + 20 + 60 + 2 + 10 * (1 + 40)
+    print("{} families, {} model objects each".format(count, objects))
+
+    _, dict_bytes = measure("__dict__", lambda p: to_namespace(Family.from_json(p)), payloads)
+
+    # the indexes are dropped while tracing, so their blocks count as freed
+    tracemalloc.start()
+    catalog = [Family.from_json(payload) for payload in payloads]
+    slot_bytes, _ = tracemalloc.get_traced_memory()
+    for family in catalog:
+        drop_indexes(family)
+    bare_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:<12} {:>10.1f} MB".format("__slots__", slot_bytes / 1024 / 1024))
+    print("{:<12} {:>10.1f} MB".format("  indexes", (slot_bytes - bare_bytes) / 1024 / 1024))
+    print("saved {:.0%}, {:.0%} without the indexes".format(1 - slot_bytes / dict_bytes, 1 - bare_bytes / dict_bytes))
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from fetchbim.bimservice import get_ids
+from fetchbim.client import AsyncFetchClient
+from fetchbim.notion import RelationResolver
+from fetchbim.sequence import Pipeline, ProcessStage, Stage
+from fetchbim.sync import content_calendar_index
+from fetchbim.transform import apply_relations, notion_payload
+
+
+async def main(family_ids):
+    resolver = RelationResolver()
+    resolver.preload()
+    index = content_calendar_index(resolver)
+    async with AsyncFetchClient() as client:
+
+        async def post(result):
+            family_id, payload, relations = result
+            payload = apply_relations(payload, relations, resolver)
+            return await client.post_notion_payload(family_id, payload, index=index)
+
+        # each family is posted as soon as it is fetched, instead of after the whole batch, and the
+        # payloads are built in worker processes so the event loop only does I/O
+        pipeline = Pipeline(
+            Stage(client.get_family, concurrency=10),
+            ProcessStage(notion_payload),
+            Stage(post, concurrency=3),
+        )
+        async for result in pipeline.stream(family_ids):
+            print(result["id"])
+
+
+start_time = time.time()
+
+if __name__ == "__main__":
+    family_ids = get_ids()
+    asyncio.run(main(family_ids))
+
+    print("--- %s seconds ---" % (time.time() - start_time))
@@ -8,6 +8,7 @@ EMAIL = "kbruxvoort@southwestsolutions.com"
 AUTHOR = "Kyle Bruxvoort"
 VERSION = "0.0.2"
 REQUIRED = ["requests==2.26.0", "aiohttp>=3.7.4", "pymsteams==0.1.15", "ipykernel==6.3.1"]
+EXTRAS = {"fast": ["orjson>=3.6"]}
 
 
 setup(
@@ -19,6 +20,7 @@ setup(
     url=URL,
     py_modules=["fetchbim"],
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
     include_package_data=True,
     license="MIT",
 )